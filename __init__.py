@@ -4,7 +4,16 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 import os
+import sqlite3
+from model.pool import MeteredQueuePool
+from model.routing import init_replica_routing
+from model.unit_of_work import UnitOfWorkSession, init_unit_of_work
+from model.cache import cache
+from model.json_provider import init_json
+from model.compression import init_compression
 
 # Load environment variables from .env file
 load_dotenv()
@@ -60,7 +69,83 @@ app.config['SQLALCHEMY_DATABASE_STRING'] = dbString
 app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
 app.config['SQLALCHEMY_BACKUP_URI'] = backupURI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+
+# Connection pool settings, for MySQL in production and the SQLite file in development
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': MeteredQueuePool,  # QueuePool with checkout-wait gauges for /api/metrics/pool
+    'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),  # connections kept open per worker
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),  # extra connections opened under bursts, closed when returned
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT') or 10),  # seconds to wait for a connection before failing the request
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 280),  # seconds, replaced before MySQL or a proxy drops them as idle
+    'pool_pre_ping': (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() == 'true',  # test each connection on checkout, replacing stale ones
+}
+
+# SQLite connection settings, applied to every new connection so gunicorn workers read while one writes
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL',  # readers no longer wait on the writer
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL',  # fsync at checkpoints rather than every commit, safe with WAL
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 20000),  # page cache per connection, negative is KiB
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),  # bytes of the file read through mmap
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000),  # wait for the write lock instead of "database is locked"
+    'foreign_keys': 'ON' if (os.environ.get('SQLITE_FOREIGN_KEYS') or 'true').lower() == 'true' else 'OFF',
+}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Applies app.config['SQLITE_PRAGMAS'] to each new SQLite connection; other databases are left alone.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {pragma} = {value}')
+    cursor.close()
+
+# Read replica settings, GET requests to these paths read from the replica when DB_REPLICA_URI is set
+REPLICA_URI = os.environ.get('DB_REPLICA_URI') or None  # for example sqlite:///volumes/user_management_replica.db
+if REPLICA_URI:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': REPLICA_URI}
+app.config['REPLICA_READ_PATHS'] = ['/api/posts', '/api/users', '/api/channels', '/api/ai/logs', '/api/palomar']
+app.config['REPLICA_READ_YOUR_WRITES'] = int(os.environ.get('REPLICA_READ_YOUR_WRITES') or 5)  # seconds a client reads from the primary after writing
+
+# Commit once per request instead of on every model call, see model/unit_of_work.py
+app.config['UNIT_OF_WORK'] = (os.environ.get('UNIT_OF_WORK') or 'true').lower() == 'true'
+
+# Per-request latency and query metrics, see api/metrics.py
+app.config['METRICS_SERVER_TIMING'] = (os.environ.get('METRICS_SERVER_TIMING') or 'false').lower() == 'true'  # add a Server-Timing header to responses
+app.config['METRICS_SLOW_REQUEST_MS'] = int(os.environ.get('METRICS_SLOW_REQUEST_MS') or 1000)  # log the queries of slower requests, 0 to disable
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # bearer token required to scrape /metrics, which answers 404 when unset
+
+# JSON encoder of responses, auto uses orjson when installed, see model/json_provider.py
+app.config['JSON_ENCODER'] = os.environ.get('JSON_ENCODER') or 'auto'  # auto, orjson or stdlib
+init_json(app)
+
+# The prediction models load pandas and scikit-learn on first use; set to build them at boot instead
+app.config['PRELOAD_MODELS'] = (os.environ.get('PRELOAD_MODELS') or 'false').lower() == 'true'
+
+# Outbound calls of the proxy endpoints, see api/upstream.py
+app.config['UPSTREAM_CONCURRENCY'] = int(os.environ.get('UPSTREAM_CONCURRENCY') or 32)  # calls in flight at once per worker
+app.config['UPSTREAM_QUEUE_TIMEOUT'] = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT') or 2)  # seconds to wait for a free slot before answering 503
+app.config['UPSTREAM_CONNECT_TIMEOUT'] = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT') or 3)  # seconds
+app.config['UPSTREAM_TIMEOUT'] = float(os.environ.get('UPSTREAM_TIMEOUT') or 10)  # seconds to wait for the response
+app.config['UPSTREAM_BASE_URL'] = os.environ.get('UPSTREAM_BASE_URL') or None  # send all calls to this server instead, for load tests against a stub
+
+# Bump to change the ETags of the conditional GET endpoints when a deploy changes their responses, see model/conditional.py
+app.config['ETAG_VERSION'] = os.environ.get('ETAG_VERSION') or '1'
+
+# Response compression, see model/compression.py
+app.config['COMPRESS_ENABLED'] = (os.environ.get('COMPRESS_ENABLED') or 'true').lower() == 'true'
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)  # bytes, smaller bodies fit a packet or two anyway
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL') or 6)
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 5)  # 0-11, above 5 costs far more CPU for little gain
+app.config['COMPRESS_SKIP_PATHS'] = ['/uploads']  # images are already compressed
+app.config['COMPRESS_CACHE_BYTES'] = int(os.environ.get('COMPRESS_CACHE_BYTES') or 4 * 1024 * 1024)  # compressed template pages kept per worker
+init_compression(app)  # first, so its after_request hook runs after the others
+
+db = SQLAlchemy(app, session_options={'class_': UnitOfWorkSession})
+init_replica_routing(app, db)
+init_unit_of_work(app, db)
 migrate = Migrate(app, db)
 
 # Image upload settings 
@@ -68,6 +153,49 @@ app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # maximum size of uploaded c
 app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif']  # supported file types
 app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.config['BLOB_FOLDER'] = os.path.join(app.instance_path, 'blobs')  # content-addressed store for uploaded images
+os.makedirs(app.config['BLOB_FOLDER'], exist_ok=True)
+app.config['IMAGE_VARIANT_SIZES'] = [64, 128, 256]  # thumbnail bounding boxes built for each uploaded image
+app.config['IMAGE_VARIANT_WORKERS'] = int(os.environ.get('IMAGE_VARIANT_WORKERS') or 2)  # background threads building variants
+app.config['IMAGE_WEBP_QUALITY'] = 80
+
+# Cache settings, see model/cache.py
+app.config['CACHE_LOCAL_SIZE'] = int(os.environ.get('CACHE_LOCAL_SIZE') or 1024)  # entries kept in each worker
+app.config['CACHE_SHARED_PATH'] = os.environ.get('CACHE_SHARED_PATH', os.path.join(app.instance_path, 'cache.db')) or None  # SQLite file shared by workers, set empty for per-worker only
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL') or 300)  # seconds
+app.config['CACHE_TTLS'] = {  # seconds per namespace
+    'weather': int(os.environ.get('CACHE_TTL_WEATHER') or 600),
+    'currency': int(os.environ.get('CACHE_TTL_CURRENCY') or 300),
+    'nav': int(os.environ.get('CACHE_TTL_NAV') or 86400),  # invalidated on every section, group or channel change
+}
+cache.init_app(app, db)
+
+# Post search settings, see model/search.py
+app.config['SEARCH_PER_PAGE'] = int(os.environ.get('SEARCH_PER_PAGE') or 20)  # results per page when the request does not say
+app.config['SEARCH_MAX_PER_PAGE'] = int(os.environ.get('SEARCH_MAX_PER_PAGE') or 100)
+app.config['SEARCH_RANK_WINDOW'] = int(os.environ.get('SEARCH_RANK_WINDOW') or 5000)  # newest matches ranked and paged on SQLite, broader queries should be narrowed
+
+# Backup settings for custom backup_data
+app.config['BACKUP_COMPRESSION'] = os.environ.get('BACKUP_COMPRESSION') or None  # gzip or zstd, uncompressed when unset
+app.config['BACKUP_BATCH_SIZE'] = int(os.environ.get('BACKUP_BATCH_SIZE') or 1000)  # rows loaded per query on backup, written per transaction on restore
+app.config['BACKUP_WORKERS'] = int(os.environ.get('BACKUP_WORKERS') or 4)  # tables exported at the same time
+app.config['BACKUP_CHANGE_OVERLAP'] = int(os.environ.get('BACKUP_CHANGE_OVERLAP') or 1000)  # change numbers below each watermark checked again for late commits
+app.config['SQLITE_BACKUP_PAGES'] = int(os.environ.get('SQLITE_BACKUP_PAGES') or 256)  # pages copied per step of the online snapshot
+app.config['SQLITE_BACKUP_SLEEP'] = float(os.environ.get('SQLITE_BACKUP_SLEEP') or 0.005)  # seconds writers get between steps
+
+# Rate limit settings, limits are "<attempts>/<seconds>" per uid and per client IP
+app.config['RATE_LIMIT_STORAGE'] = os.environ.get('RATE_LIMIT_STORAGE') or None  # SQLite file shared by workers, in-process when unset
+app.config['RATE_LIMIT_TRUST_PROXY'] = (os.environ.get('RATE_LIMIT_TRUST_PROXY') or 'false').lower() == 'true'  # use X-Forwarded-For for the client IP
+app.config['RATE_LIMITS'] = {
+    'login': {
+        'uid': os.environ.get('RATE_LIMIT_LOGIN_UID') or '5/60',
+        'ip': os.environ.get('RATE_LIMIT_LOGIN_IP') or '20/60',
+    },
+    'authenticate': {
+        'uid': os.environ.get('RATE_LIMIT_AUTHENTICATE_UID') or '5/60',
+        'ip': os.environ.get('RATE_LIMIT_AUTHENTICATE_IP') or '20/60',
+    },
+}
 
 # GITHUB settings
 app.config['GITHUB_API_URL'] = 'https://api.github.com'
@@ -7,6 +7,7 @@ from api.jwt_authorize import token_required
 from model.channel import Channel
 from model.group import Group
 from model.user import User
+from model.conditional import conditional
 
 """
 This Blueprint object is used to define APIs for the Channel model.
@@ -140,9 +141,10 @@ class ChannelAPI:
             # Return the results of the bulk creation process
             return jsonify(results)
         
+        @conditional(Channel)
         def get(self):
             """
-            Retrieve all channels.
+            Retrieve all channels, or 304 when the If-None-Match ETag is current.
             """
             # Find all the channels
             channels = Channel.query.all()
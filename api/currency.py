@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource
 import requests
+from api.upstream import upstream
+from model.cache import cache
 
 # blueprint for the currency conversion api
 currency_api = Blueprint('currency_api', __name__, url_prefix='/api')
@@ -38,14 +40,16 @@ class CurrencyAPI:
     api.add_resource(_CurrencyConversion, '/convertcurrency')
 
 # Function to fetch conversion data from the API
+@cache.cached('currency')
 def get_conversion_data(have, want, amount):
     # Construct the URL for the API request
     api_url = currency_api_url.format(have, want, amount)
     
-    response = requests.get(api_url, headers={'X-Api-Key': api_key})
+    response = upstream.get(api_url, headers={'X-Api-Key': api_key})
     
-    if response.status_code == requests.codes.ok:
+    if response is not None and response.status_code == requests.codes.ok:
         return response.json()
     else:
-        print("Error:", response.status_code, response.text)
+        if response is not None:
+            print("Error:", response.status_code, response.text)
         return None
@@ -2,6 +2,7 @@ from flask import Flask, Blueprint, request, jsonify
 from flask_restful import Api, Resource
 import requests
 from model.flight_api_post import Flight
+from api.upstream import upstream
 
 app = Flask(__name__)
 
@@ -39,12 +40,13 @@ class FlightAPI:
 
 def get_flight_data(origin, destination, access_key):
     api_url = f"{base_flight_api_url}?access_key={access_key}&dep_iata={origin}&arr_iata={destination}"
-    response = requests.get(api_url)
+    response = upstream.get(api_url)
 
-    if response.status_code == requests.codes.ok:
+    if response is not None and response.status_code == requests.codes.ok:
         return response.json()
     else:
-        print("Error:", response.status_code, response.text)
+        if response is not None:
+            print("Error:", response.status_code, response.text)
         return None
     
 
@@ -6,9 +6,6 @@ from model.grade_model import GradePredictionModel
 grade_api = Blueprint('grade_api', __name__, url_prefix='/api/grade')
 api = Api(grade_api)
 
-# Create model instance
-model_instance = GradePredictionModel()
-
 # Define the resource class
 class GradeAPI:
     class _Predict(Resource):
@@ -31,7 +28,7 @@ class GradeAPI:
             if not all(1 <= val <= 5 for val in user_input):
                 return {"error": "Input values should be between 1 and 5."}, 400
 
-            percent, letter = model_instance.predict(user_input)
+            percent, letter = GradePredictionModel.get_instance().predict(user_input)
 
             return jsonify({
                 'predicted_percent': percent,
@@ -7,6 +7,7 @@ from api.jwt_authorize import token_required
 from model.group import Group
 from model.user import User
 from model.section import Section
+from model.conditional import conditional
 
 """
 This Blueprint object is used to define APIs for the Group model.
@@ -133,17 +134,15 @@ class GroupAPI:
             # Return the results of the bulk creation process
             return jsonify(results)
         
+        @conditional(Group)
         def get(self):
             """
-            Retrieve all groups.
+            Retrieve all groups, or 304 when the If-None-Match ETag is current.
             """
             # Find all the groups
             groups = Group.query.all()
-            # Prepare a JSON list of all the groups, using list comprehension
-            json_ready = []
-            for group in groups:
-                group_data = group.read()
-                json_ready.append(group_data)
+            # Prepare a JSON list of all the groups, reading their moderator ids in one query
+            json_ready = Group.read_many(groups)
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
@@ -212,8 +211,8 @@ class GroupAPI:
             
             # Find all groups under the section
             groups = Group.query.filter_by(_section_id=section.id).all()
-            # Prepare a JSON list of all the groups, using list comprehension
-            json_ready = [group.read() for group in groups]
+            # Prepare a JSON list of all the groups, reading their moderator ids in one query
+            json_ready = Group.read_many(groups)
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
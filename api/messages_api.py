@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource
 import requests
 import json
+from api.upstream import upstream
 
 # Create a Blueprint for the messages API
 messages_api = Blueprint('messages_api', __name__, url_prefix='/api')
@@ -65,10 +66,11 @@ class MessagesAPI:
 def get_trivia_question(topic):
     """Fetch a trivia question from the API."""
     api_url = TRIVIA_API_URL.format(topic)
-    response = requests.get(api_url, headers={'X-Api-Key': API_KEY})
-    if response.status_code == requests.codes.ok:
+    response = upstream.get(api_url, headers={'X-Api-Key': API_KEY})
+    if response is not None and response.status_code == requests.codes.ok:
         question = json.loads(response.text)[0]['question']
         return question
     else:
-        print("Error:", response.status_code, response.text)
+        if response is not None:
+            print("Error:", response.status_code, response.text)
         return None
@@ -0,0 +1,346 @@
+import bisect
+import hmac
+import logging
+import os
+import re
+import resource
+import threading
+import time
+from contextvars import ContextVar
+from flask import Blueprint, Response, abort, jsonify, request
+from flask_restful import Api, Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.wsgi import ClosingIterator
+from __init__ import app, db
+from api.jwt_authorize import token_required
+from api.upstream import upstream
+from model.cache import cache
+
+"""
+Per-request performance instrumentation.
+
+A WSGI middleware opens a record for each request, and SQLAlchemy cursor hooks add every statement the
+request runs to it, with its time. When the request ends, which is when the server closes the body, so
+a streamed response is timed to its last chunk, its latency, query count and SQL time go into Prometheus
+histograms served at /metrics, the statements are added to per-statement totals under their normalized
+text (literals and IN lists folded), and requests slower than METRICS_SLOW_REQUEST_MS are logged with
+their full query list. METRICS_SERVER_TIMING adds a Server-Timing header with the split.
+Each worker also reports how long it took to boot and its resident memory.
+"""
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+MAX_STATEMENTS = 500  # distinct normalized statements tracked, later ones are counted as 'other'
+MAX_REQUEST_QUERIES = 1000  # queries kept per request for the slow request log
+
+slow_log = logging.getLogger('slow_requests')
+_current = ContextVar('request_metrics', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)')
+_VALUES = re.compile(r'(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """
+    Folds a SQL statement into its shape, so statements differing only in literals or list lengths are counted together.
+    """
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(...)', statement)
+    statement = _VALUES.sub(r'\1', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+class Histogram:
+    """
+    Prometheus histogram with labels, rendered in the text exposition format.
+    """
+    def __init__(self, name, help_text, buckets, labelnames):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, labels):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+def process_age():
+    """
+    Returns the seconds since this process started, from /proc on Linux, else the CPU time it has used.
+    """
+    try:
+        with open('/proc/self/stat') as stat, open('/proc/uptime') as uptime:
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+            return float(uptime.read().split()[0]) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.process_time()
+
+def process_rss():
+    """
+    Returns the resident and peak resident memory of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if os.uname().sysname == 'Darwin' else peak * 1024  # kilobytes on Linux
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize(), peak
+    except (OSError, ValueError, IndexError):
+        return peak, peak
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+class RequestRecord:
+    """
+    What one request spent its time on.
+    """
+    __slots__ = ('method', 'path', 'route', 'status', 'start', 'query_count', 'sql_seconds', 'queries')
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = 0
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.queries = []
+
+    def server_timing(self, elapsed):
+        return (f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.query_count} queries", '
+                f'app;dur={(elapsed - self.sql_seconds) * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+
+class RequestMetrics:
+    """
+    WSGI middleware and SQLAlchemy hooks that time each request and its queries.
+    """
+    def __init__(self, app=None):
+        self.server_timing = False
+        self.slow_seconds = None
+        self.requests = Histogram('http_request_duration_seconds', 'Request latency.', TIME_BUCKETS,
+                                  ('method', 'route', 'status'))
+        self.queries = Histogram('http_request_queries', 'SQL statements per request.', QUERY_BUCKETS, ('route',))
+        self.sql = Histogram('http_request_sql_seconds', 'Time per request spent in SQL statements.', TIME_BUCKETS,
+                             ('route',))
+        self._statements_lock = threading.Lock()
+        self.statements = {}  # normalized text: [calls, seconds, max seconds]
+        self.boot = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        slow_ms = app.config.get('METRICS_SLOW_REQUEST_MS')
+        self.slow_seconds = slow_ms / 1000 if slow_ms else None
+        app.wsgi_app = self.middleware(app.wsgi_app)
+        app.before_request(self._set_route)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def middleware(self, wsgi_app):
+        def metered_app(environ, start_response):
+            record = RequestRecord(environ.get('REQUEST_METHOD', ''), environ.get('PATH_INFO', ''))
+            token = _current.set(record)
+
+            def metered_start_response(status, headers, exc_info=None):
+                record.status = int(status.split(' ', 1)[0])
+                if self.server_timing:
+                    headers.append(('Server-Timing', record.server_timing(time.perf_counter() - record.start)))
+                return start_response(status, headers, exc_info)
+
+            try:
+                app_iter = wsgi_app(environ, metered_start_response)
+            except BaseException:
+                self._finish(record)
+                raise
+            finally:
+                _current.reset(token)
+            file_wrapper = environ.get('wsgi.file_wrapper')
+            if isinstance(file_wrapper, type) and isinstance(app_iter, file_wrapper):
+                # Wrapping would stop the server from sending the file with sendfile
+                self._finish(record)
+                return app_iter
+            # The server calls close() after the last chunk, which also closes the wrapped iterable
+            return ClosingIterator(app_iter, lambda: self._finish(record))
+        return metered_app
+
+    def _set_route(self):
+        record = _current.get()
+        if record is not None:
+            record.route = request.url_rule.rule if request.url_rule else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        record = _current.get()
+        if record is None or not conn.info.get('query_start'):
+            return
+        seconds = time.perf_counter() - conn.info['query_start'].pop()
+        record.query_count += 1
+        record.sql_seconds += seconds
+        if len(record.queries) < MAX_REQUEST_QUERIES:
+            record.queries.append((statement, seconds))
+
+    def _finish(self, record):
+        elapsed = time.perf_counter() - record.start
+        route = record.route or 'unmatched'
+        self.requests.observe(elapsed, (record.method, route, str(record.status)))
+        self.queries.observe(record.query_count, (route,))
+        self.sql.observe(record.sql_seconds, (route,))
+        with self._statements_lock:
+            for statement, seconds in record.queries:
+                text = normalize_statement(statement)
+                if text not in self.statements and len(self.statements) >= MAX_STATEMENTS:
+                    text = 'other'
+                totals = self.statements.setdefault(text, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+        if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+            slowest = sorted(record.queries, key=lambda query: query[1], reverse=True)
+            slow_log.warning(
+                "Slow request %s %s (%s) %d in %.1f ms: %d queries, %.1f ms SQL%s", record.method, record.path,
+                route, record.status, elapsed * 1000, record.query_count, record.sql_seconds * 1000,
+                ''.join(f'\n  {seconds * 1000:8.2f} ms  {normalize_statement(statement)}' for statement, seconds in slowest))
+
+    def record_boot(self):
+        """
+        Records how long this worker took to start and how much memory it holds once the app is loaded.
+
+        Returns:
+            dict: The pid, boot seconds and resident memory in bytes.
+        """
+        rss, peak = process_rss()
+        self.boot = {'pid': os.getpid(), 'boot_seconds': round(process_age(), 3), 'rss_bytes': rss}
+        logging.getLogger(__name__).info("Worker %d booted in %.2f s, %.1f MB resident (peak %.1f MB)",
+                                         self.boot['pid'], self.boot['boot_seconds'], rss / 2**20, peak / 2**20)
+        return self.boot
+
+    def slowest_statements(self, limit=20):
+        """
+        Returns the normalized statements with the most total time.
+
+        Returns:
+            list: Dictionaries with the statement text, calls, total and max milliseconds.
+        """
+        with self._statements_lock:
+            items = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'statement': text, 'calls': calls, 'total_ms': round(seconds * 1000, 3), 'max_ms': round(longest * 1000, 3)}
+                for text, (calls, seconds, longest) in items]
+
+    def render(self):
+        """
+        Renders the histograms, statement totals and pool gauges of this worker in the Prometheus text format.
+        """
+        lines = self.requests.render() + self.queries.render() + self.sql.render()
+        statements = self.slowest_statements()
+        lines += ['# HELP db_statement_seconds_total Time spent in each normalized SQL statement.',
+                  '# TYPE db_statement_seconds_total counter']
+        lines += [f'db_statement_seconds_total{{statement="{_escape(item["statement"])}"}} {item["total_ms"] / 1000:.6f}'
+                  for item in statements]
+        lines += ['# HELP db_statement_calls_total Calls of each normalized SQL statement.',
+                  '# TYPE db_statement_calls_total counter']
+        lines += [f'db_statement_calls_total{{statement="{_escape(item["statement"])}"}} {item["calls"]}'
+                  for item in statements]
+        rss, peak = process_rss()
+        lines += ['# TYPE process_resident_memory_bytes gauge', f'process_resident_memory_bytes {rss}',
+                  '# TYPE process_max_resident_memory_bytes gauge', f'process_max_resident_memory_bytes {peak}']
+        if self.boot:
+            lines += ['# HELP process_boot_seconds Seconds from process start until the app was loaded.',
+                      '# TYPE process_boot_seconds gauge', f'process_boot_seconds {self.boot["boot_seconds"]}',
+                      '# TYPE process_boot_resident_memory_bytes gauge',
+                      f'process_boot_resident_memory_bytes {self.boot["rss_bytes"]}']
+        caches = cache.read()
+        for name in ('local_hits', 'shared_hits', 'misses', 'sets', 'invalidations'):
+            lines.append(f'# TYPE cache_{name}_total counter')
+            lines += [f'cache_{name}_total{{namespace="{_escape(namespace)}"}} {counters[name]}'
+                      for namespace, counters in sorted(caches['namespaces'].items())]
+        lines += ['# TYPE cache_local_entries gauge', f'cache_local_entries {caches["local_entries"]}']
+        calls = upstream.read()
+        lines += ['# TYPE upstream_in_flight gauge', f'upstream_in_flight {calls["in_flight"]}']
+        for name in ('calls', 'rejected', 'failed'):
+            lines += [f'# TYPE upstream_{name}_total counter', f'upstream_{name}_total {calls[name]}']
+        pool = db.engine.pool
+        if hasattr(pool, 'read'):
+            gauges = pool.read()
+            for name in ('size', 'in_use', 'idle', 'overflow'):
+                lines += [f'# TYPE db_pool_{name} gauge', f'db_pool_{name} {gauges[name]}']
+            for name in ('checkouts', 'waited', 'timeouts', 'invalidated'):
+                lines += [f'# TYPE db_pool_{name}_total counter', f'db_pool_{name}_total {gauges[name]}']
+        return '\n'.join(lines) + '\n'
+
+metrics = RequestMetrics(app)
+
+# /metrics sits at the root where Prometheus scrapes by default, the JSON views under /api
+metrics_api = Blueprint('metrics_api', __name__)
+api = Api(metrics_api)
+
+@metrics_api.route('/metrics')
+def prometheus_metrics():
+    """
+    Serve the metrics of this worker to Prometheus, behind the bearer token METRICS_TOKEN.
+
+    The statement metrics carry normalized SQL, so the endpoint is not served at all without a token.
+    """
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+class MetricsAPI:
+    class _Pool(Resource):
+        @token_required("Admin")
+        def get(self):
+            """
+            Return the connection pool gauges of this worker: in-use and idle connections, checkout waits and timeouts.
+            """
+            pool = db.engine.pool
+            if not hasattr(pool, 'read'):
+                return {'message': f'{type(pool).__name__} does not keep pool metrics'}, 404
+            return jsonify({'pool': type(pool).__name__, 'database': db.engine.dialect.name, **pool.read()})
+
+    class _Statements(Resource):
+        @token_required("Admin")
+        def get(self):
+            """
+            Return the normalized SQL statements of this worker with the most total time.
+            """
+            limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_STATEMENTS)
+            return jsonify(metrics.slowest_statements(limit))
+
+    class _Cache(Resource):
+        @token_required("Admin")
+        def get(self):
+            """
+            Return the cache hit rates of this worker by namespace, and the size of both tiers.
+            """
+            return jsonify(cache.read())
+
+    api.add_resource(_Pool, '/api/metrics/pool')
+    api.add_resource(_Cache, '/api/metrics/cache')
+    api.add_resource(_Statements, '/api/metrics/statements')
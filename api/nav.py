@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify
+from flask_restful import Api, Resource
+from __init__ import db
+from model.cache import cache
+from model.channel import Channel
+from model.conditional import conditional
+from model.group import Group
+from model.section import Section
+
+"""
+The section, group and channel hierarchy in one response.
+
+The front end used to walk it with a request per level, resolving each group and channel by name.
+/api/nav returns the whole tree, built from one flat query per table and assembled in memory. The tree
+is cached in the 'nav' namespace until a section, group or channel is created, changed or deleted, and
+answered with 304 while the client's copy is current.
+"""
+
+nav_api = Blueprint('nav_api', __name__, url_prefix='/api')
+api = Api(nav_api)
+
+cache.invalidate_on(Section, 'nav')
+cache.invalidate_on(Group, 'nav')
+cache.invalidate_on(Channel, 'nav')
+
+def build_nav():
+    """
+    Builds the navigation tree from three queries.
+
+    Returns:
+        list: Sections, each with its groups, each with its channels, ordered by id.
+    """
+    sections = db.session.execute(db.select(Section.id, Section._name, Section._theme).order_by(Section.id)).all()
+    groups = db.session.execute(db.select(Group.id, Group._name, Group._section_id).order_by(Group.id)).all()
+    channels = db.session.execute(db.select(Channel.id, Channel._name, Channel._group_id).order_by(Channel.id)).all()
+
+    channels_by_group = {}
+    for id, name, group_id in channels:
+        channels_by_group.setdefault(group_id, []).append({'id': id, 'name': name})
+    groups_by_section = {}
+    for id, name, section_id in groups:
+        groups_by_section.setdefault(section_id, []).append({'id': id, 'name': name, 'channels': channels_by_group.get(id, [])})
+    return [{'id': id, 'name': name, 'theme': theme, 'groups': groups_by_section.get(id, [])} for id, name, theme in sections]
+
+class NavAPI:
+    class _Nav(Resource):
+        @conditional(Section, Group, Channel)
+        def get(self):
+            """
+            Return the section, group and channel tree, or 304 when the If-None-Match ETag is current.
+            """
+            return jsonify(cache.get_or_set('nav', 'tree', build_nav))
+
+    api.add_resource(_Nav, '/nav')
@@ -1,16 +1,29 @@
-from flask import Blueprint, g, request
+import os
+from flask import Blueprint, g, request, send_file, url_for
 from flask_restful import Api, Resource
 from api.jwt_authorize import token_required
 from model.user import User
-from model.pfp import pfp_base64_decode, pfp_base64_upload, pfp_file_delete
+from model.pfp import pfp_base64_decode, pfp_base64_upload, pfp_file_delete, pfp_file_etag, pfp_file_path, image_variant_path
 
 pfp_api = Blueprint('pfp_api', __name__, url_prefix='/api/id')
 api = Api(pfp_api)
 
+# Versioned image URLs never change content, so browsers may keep them for a year
+PFP_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def pfp_image_url(user, etag, size=None):
+    """
+    Returns the versioned URL of a user's profile picture image, optionally scaled for the displayed size.
+    """
+    return url_for('pfp_api.pfp_image', uid=user.uid, v=etag[:16], size=size)
+
 class _PFP(Resource):
     """
     Retrieves the current user's profile picture as a base64 encoded string.
 
+    Kept for compatibility with existing clients, new clients should load the image from the 'url' returned
+    alongside the base64 string, which is served by _PFPImage as a cacheable binary response.
+
     This endpoint allows users to fetch their profile picture. The profile picture is returned as a base64 encoded string,
     which can be directly used in the src attribute of an img tag on the client side. This method ensures that only the
     authenticated user can access their profile picture.
@@ -35,7 +48,8 @@ class _PFP(Resource):
             base64_encode = pfp_base64_decode(current_user.uid, current_user.pfp)
             if not base64_encode:
                 return {'message': 'An error occurred while reading the profile picture.'}, 500
-            return {'pfp': base64_encode}, 200
+            etag = pfp_file_etag(pfp_file_path(current_user.uid, current_user.pfp))
+            return {'pfp': base64_encode, 'url': pfp_image_url(current_user, etag) if etag else None}, 200
         else:
             return {'message': 'Profile picture is not set.'}, 404
 
@@ -128,4 +142,64 @@ class _PFP(Resource):
         except Exception as e:
             return {'message': f'A database error occurred while assigning profile picture: {str(e)}'}, 500
         
+class _PFPImage(Resource):
+    """
+    Serves a profile picture as a binary image.
+
+    The file is streamed with send_file, which hands it to the server's sendfile support when available. The ETag
+    is the SHA-256 of the file content, so a request with a matching If-None-Match header gets a 304 without a body.
+
+    Users may fetch their own picture; admins may fetch any user's picture with the 'uid' query parameter. When the
+    'v' query parameter matches the current content hash the URL is treated as versioned and cached for a year,
+    otherwise clients must revalidate with the ETag on every use.
+
+    The 'size' query parameter asks for the displayed size in pixels; the smallest thumbnail covering it is served,
+    as WebP when the Accept header allows it.
+
+    Returns:
+    - The image with ETag and Cache-Control headers and HTTP status code 200, or 304 when the client copy is current.
+    - HTTP status code 403 if a non-admin asks for another user's picture.
+    - HTTP status code 404 if the user is not found or the profile picture is not set.
+    """
+    @token_required()
+    def get(self):
+        current_user = g.current_user
+
+        user = current_user
+        uid = request.args.get('uid')
+        if uid and uid != current_user.uid:
+            if current_user.role != 'Admin':
+                return {'message': 'Unauthorized.'}, 403
+            user = User.query.filter_by(_uid=uid).first()
+            if not user:
+                return {'message': 'User not found'}, 404
+
+        if not user.pfp:
+            return {'message': 'Profile picture is not set.'}, 404
+        img_path = pfp_file_path(user.uid, user.pfp)
+        version = pfp_file_etag(img_path) if os.path.isfile(img_path) else None
+        if not version:
+            return {'message': 'Profile picture is not set.'}, 404
+
+        # Thumbnails and WebP variants are derived from the original, so the original's hash versions them too
+        size = request.args.get('size', type=int)
+        webp = any(mimetype == 'image/webp' for mimetype, _ in request.accept_mimetypes)  # only when named explicitly
+        variant_path = image_variant_path(user.uid, user.pfp, size, webp)
+        etag = pfp_file_etag(variant_path) if variant_path != img_path else version
+        if not etag:
+            return {'message': 'An error occurred while reading the profile picture.'}, 500
+
+        response = send_file(variant_path, etag=etag, conditional=True, max_age=0)
+        response.vary.update(('Cookie', 'Accept'))
+        if request.args.get('v') == version[:16]:
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = PFP_IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        response.cache_control.private = True
+        response.cache_control.public = False
+        return response
+
 api.add_resource(_PFP, '/pfp')
+api.add_resource(_PFPImage, '/pfp/image', endpoint='pfp_image')
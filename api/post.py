@@ -6,6 +6,7 @@ from __init__ import app
 from api.jwt_authorize import token_required
 from model.post import Post
 from model.channel import Channel
+from model.search import SearchIndexMissing, search_posts
 
 """
 This Blueprint object is used to define APIs for the Post model.
@@ -196,15 +197,46 @@ class PostAPI:
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
+    class _SEARCH(Resource):
+        @token_required()
+        def get(self):
+            """
+            Search posts by words in their title, comment or content, best matches first.
+
+            Query parameters: q, the words to search for; channel_id, repeatable, to search only those
+            channels; page, from 1; per_page, up to SEARCH_MAX_PER_PAGE. The response carries the total
+            number of matches, the number ranked, and the posts of the page. On SQLite only the newest
+            SEARCH_RANK_WINDOW matches are ranked, so ranked is at most that and pages past it are empty;
+            older matches past the window are never ranked or returned, and a narrower query finds them.
+            """
+            # Obtain and validate the query parameters
+            query = request.args.get('q', '').strip()
+            if not query:
+                return {'message': 'Search query q is required'}, 400
+            channel_ids = request.args.getlist('channel_id', type=int)
+            page = request.args.get('page', 1, type=int)
+            per_page = request.args.get('per_page', current_app.config['SEARCH_PER_PAGE'], type=int)
+            if page < 1 or not 1 <= per_page <= current_app.config['SEARCH_MAX_PER_PAGE']:
+                return {'message': 'Page or per_page out of range'}, 400
+            # Find the matching posts of the page, ranked
+            try:
+                found = search_posts(query, channel_ids, page, per_page, current_app.config['SEARCH_RANK_WINDOW'])
+            except SearchIndexMissing as e:
+                return {'message': str(e)}, 503
+            # Return the page with the total count, converting Python dictionaries to JSON format
+            return jsonify({'query': query, 'page': page, 'per_page': per_page, **found})
+
     """
-    Map the _CRUD, _USER, _BULK_CRUD, and _FILTER classes to the API endpoints for /post, /post/user, /posts, and /posts/filter.
+    Map the _CRUD, _USER, _BULK_CRUD, _FILTER and _SEARCH classes to the API endpoints for /post, /post/user, /posts, /posts/filter and /posts/search.
     - The API resource class inherits from flask_restful.Resource.
     - The _CRUD class defines the HTTP methods for the API.
     - The _USER class defines the endpoints for retrieving posts by the current user.
     - The _BULK_CRUD class defines the bulk operations for the API.
     - The _FILTER class defines the endpoints for filtering posts by channel ID and user ID.
+    - The _SEARCH class defines the endpoint for full-text search of posts.
     """
     api.add_resource(_CRUD, '/post')
     api.add_resource(_USER, '/post/user')
     api.add_resource(_BULK_CRUD, '/posts')
-    api.add_resource(_FILTER, '/posts/filter')
\ No newline at end of file
+    api.add_resource(_FILTER, '/posts/filter')
+    api.add_resource(_SEARCH, '/posts/search')
\ No newline at end of file
@@ -0,0 +1,264 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import Blueprint, request, jsonify
+from flask_restful import Api, Resource
+from __init__ import app
+from api.jwt_authorize import token_required
+
+"""
+Sliding window rate limiter for the login and authentication endpoints.
+
+Each key (a client IP, or a uid with the client IP it is attempted from) keeps only three numbers: the
+index of the current fixed window, the number of hits in the previous window and the number of hits in
+the current window. The sliding estimate weights the previous window by how much of it still overlaps
+the sliding window, which is accurate enough for throttling and uses constant memory per key.
+
+Rejected attempts are turned away before the user is looked up or the password is hashed. The uid
+counter is kept per client IP, so attempts from other addresses cannot lock a user out of their account;
+guessing one uid from many addresses is bounded by each address's own limit.
+"""
+
+def parse_limit(value):
+    """
+    Parses a limit in the "<attempts>/<seconds>" format used by the RATE_LIMITS config.
+
+    Args:
+        value (str): The limit, for example "5/60".
+
+    Returns:
+        tuple: The number of attempts allowed and the window period in seconds.
+    """
+    attempts, period = str(value).split('/')
+    return int(attempts), int(period)
+
+def slide(entry, window):
+    """
+    Moves a counter entry forward to the given window.
+
+    Args:
+        entry (tuple): The stored (window, previous, current) counters, or None for a new key.
+        window (int): The index of the current fixed window.
+
+    Returns:
+        tuple: The (window, previous, current) counters aligned to the current window.
+    """
+    if entry is None:
+        return window, 0, 0
+    last_window, previous, current = entry
+    if last_window == window:
+        return entry
+    if last_window == window - 1:
+        return window, current, 0
+    return window, 0, 0
+
+def evaluate(entry, limit, period, now):
+    """
+    Applies one attempt to a counter entry.
+
+    Args:
+        entry (tuple): The (window, previous, current) counters aligned to the current window.
+        limit (int): The number of attempts allowed per period.
+        period (int): The window period in seconds.
+        now (float): The current time in seconds.
+
+    Returns:
+        tuple: The updated entry and the seconds to wait before retrying (0 when the attempt is allowed).
+    """
+    window, previous, current = entry
+    elapsed = (now % period) / period
+    estimate = previous * (1 - elapsed) + current
+    if estimate < limit:
+        return (window, previous, current + 1), 0
+
+    # Wait until the previous window has decayed enough, or the next window starts
+    if current >= limit or previous == 0:
+        retry_after = period - (now % period)
+    else:
+        retry_after = (1 - (limit - current) / previous - elapsed) * period
+    return entry, max(1, math.ceil(retry_after))
+
+class MemoryBackend:
+    """
+    Keeps the sliding window counters in this process.
+
+    Used when RATE_LIMIT_STORAGE is not set. Each gunicorn worker then enforces its own limits.
+    """
+    PRUNE_EVERY = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._hits = 0
+
+    def hit(self, key, limit, period, now):
+        window = int(now // period)
+        with self._lock:
+            entry, retry_after = evaluate(slide(self._counters.get(key), window), limit, period, now)
+            self._counters[key] = entry
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return retry_after
+
+    def _prune(self, now):
+        # Keys whose counters are two windows old no longer affect any estimate
+        for key, (last_window, _, _) in list(self._counters.items()):
+            _, period = key.rsplit('|', 1)
+            if last_window < int(now // int(period)) - 1:
+                del self._counters[key]
+
+    def size(self):
+        return len(self._counters)
+
+class SQLiteBackend:
+    """
+    Keeps the sliding window counters in a SQLite file so every gunicorn worker shares the same limits.
+
+    Args:
+        path (str): The path to the SQLite file, created on first use.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, window INTEGER NOT NULL, '
+                'previous INTEGER NOT NULL, current INTEGER NOT NULL, expires REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limits_expires ON rate_limits (expires)')
+
+    def _connect(self):
+        # One connection per thread, reopened in forked workers since SQLite handles must not cross a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, limit, period, now):
+        window = int(now // period)
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic across workers
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT window, previous, current FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            entry, retry_after = evaluate(slide(row, window), limit, period, now)
+            if retry_after == 0:
+                # Counters stop affecting any estimate once the window after this one has passed
+                conn.execute(
+                    'INSERT INTO rate_limits (key, window, previous, current, expires) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET window = excluded.window, previous = excluded.previous, '
+                    'current = excluded.current, expires = excluded.expires',
+                    (key, *entry, (window + 2) * period)
+                )
+            conn.execute('DELETE FROM rate_limits WHERE expires < ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return retry_after
+
+    def size(self):
+        return self._connect().execute('SELECT COUNT(*) FROM rate_limits WHERE expires >= ?', (time.time(),)).fetchone()[0]
+
+class RateLimiter:
+    """
+    Per-IP and per-uid-and-IP sliding window limiter with limits configured per route.
+
+    Limits come from app.config['RATE_LIMITS'], a dictionary of route name to {'uid': "<attempts>/<seconds>",
+    'ip': "<attempts>/<seconds>"}. Counters of allowed and rejected attempts are kept per route.
+    """
+    def __init__(self, app=None):
+        self.backend = None
+        self.limits = {}
+        self.trust_proxy = False
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        storage = app.config.get('RATE_LIMIT_STORAGE')
+        self.backend = SQLiteBackend(storage) if storage else MemoryBackend()
+        self.limits = {route: {scope: parse_limit(limit) for scope, limit in scopes.items()}
+                       for route, scopes in app.config.get('RATE_LIMITS', {}).items()}
+        self.trust_proxy = app.config.get('RATE_LIMIT_TRUST_PROXY', False)
+        self.stats = {route: {'allowed': 0, 'rejected': 0} for route in self.limits}
+
+    def client_ip(self):
+        """
+        Returns the client address, using X-Forwarded-For only when the app sits behind a trusted proxy.
+        """
+        if self.trust_proxy and request.access_route:
+            return request.access_route[0]
+        return request.remote_addr or 'unknown'
+
+    def check(self, route, uid=None):
+        """
+        Records an attempt on a route and decides whether it may proceed.
+
+        Args:
+            route (str): The route name, a key of app.config['RATE_LIMITS'].
+            uid (str, optional): The uid the attempt is made for.
+
+        Returns:
+            int: 0 when the attempt is allowed, otherwise the seconds to wait before retrying.
+        """
+        limits = self.limits.get(route)
+        if not limits:
+            return 0
+
+        ip = self.client_ip()
+        keys = []
+        if 'ip' in limits:
+            keys.append(('ip', ip))
+        if 'uid' in limits and uid:
+            keys.append(('uid', f'{uid}|{ip}'))
+
+        now = time.time()
+        retry_after = 0
+        for scope, value in keys:
+            limit, period = limits[scope]
+            retry_after = self.backend.hit(f'{route}|{scope}|{value}|{period}', limit, period, now)
+            if retry_after:
+                break
+
+        with self._stats_lock:
+            counters = self.stats.setdefault(route, {'allowed': 0, 'rejected': 0})
+            counters['rejected' if retry_after else 'allowed'] += 1
+        return retry_after
+
+    def read(self):
+        """
+        Returns the attempt counters of this process and the limits in force.
+        """
+        with self._stats_lock:
+            stats = {route: dict(counters) for route, counters in self.stats.items()}
+        return {
+            'backend': type(self.backend).__name__,
+            'tracked_keys': self.backend.size(),
+            'limits': {route: {scope: f'{limit}/{period}' for scope, (limit, period) in scopes.items()}
+                       for route, scopes in self.limits.items()},
+            'routes': stats,
+        }
+
+limiter = RateLimiter(app)
+
+rate_limit_api = Blueprint('rate_limit_api', __name__, url_prefix='/api')
+api = Api(rate_limit_api)
+
+class RateLimitAPI:
+    class _Stats(Resource):
+        @token_required("Admin")
+        def get(self):
+            """
+            Return the rate limiter counters and limits.
+            """
+            return jsonify(limiter.read())
+
+    api.add_resource(_Stats, '/ratelimit')
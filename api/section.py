@@ -5,6 +5,7 @@ from datetime import datetime
 from __init__ import app
 from api.jwt_authorize import token_required
 from model.section import Section
+from model.conditional import conditional
 
 """
 This Blueprint object is used to define APIs for the Section model.
@@ -134,9 +135,10 @@ class SectionAPI:
             # Return the results of the bulk creation process
             return jsonify(results)
         
+        @conditional(Section)
         def get(self):
             """
-            Retrieve all sections.
+            Retrieve all sections, or 304 when the If-None-Match ETag is current.
             """
             # Find all the sections
             sections = Section.query.all()
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource
 import requests
 import json
+from api.upstream import upstream
 
 # blueprint for the hotel api
 hotel_api = Blueprint('hotel_api', __name__, url_prefix='/api')
@@ -34,9 +35,10 @@ class HotelAPI:
 def get_hotel_data(hotel, place):
 
     api_url = f"{base_hotel_api_url}?q={hotel},{place}&format=json&addressdetails=1"
-    response = requests.get(api_url, headers={"User-Agent": "MyHotelApp/1.0 (contact@example.com)"})
-    if response.status_code == requests.codes.ok:
+    response = upstream.get(api_url, headers={"User-Agent": "MyHotelApp/1.0 (contact@example.com)"})
+    if response is not None and response.status_code == requests.codes.ok:
         return response.json()
     else:
-        print("Error:", response.status_code, response.text)
+        if response is not None:
+            print("Error:", response.status_code, response.text)
         return None
\ No newline at end of file
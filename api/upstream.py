@@ -0,0 +1,101 @@
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from werkzeug.exceptions import ServiceUnavailable
+from __init__ import app
+
+"""
+Outbound HTTP for the endpoints that proxy a remote API (weather, currency, flights, trivia, hotels).
+
+These handlers spend almost all their time waiting on the remote server, so they are served by threads:
+run gunicorn with GUNICORN_THREADS > 1 and each worker handles that many calls at once. Calls share
+one keep-alive connection pool per worker, and at most UPSTREAM_CONCURRENCY of them are in flight at a
+time. A call that cannot start within UPSTREAM_QUEUE_TIMEOUT is turned away with 503 rather than
+piling up behind a slow upstream, and every call gives up after UPSTREAM_TIMEOUT.
+"""
+
+class UpstreamBusy(ServiceUnavailable):
+    """
+    Raised when no outbound slot frees up within UPSTREAM_QUEUE_TIMEOUT, answered as 503 with Retry-After.
+    """
+    description = 'Too many requests to the remote service, try again shortly'
+
+class UpstreamClient:
+    """
+    Bounded, pooled HTTP client shared by the threads of a worker.
+    """
+    def __init__(self, app=None):
+        self.session = requests.Session()
+        self.slots = None
+        self.timeout = None
+        self.queue_timeout = None
+        self.base_url = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        concurrency = app.config['UPSTREAM_CONCURRENCY']
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.timeout = (app.config['UPSTREAM_CONNECT_TIMEOUT'], app.config['UPSTREAM_TIMEOUT'])
+        self.queue_timeout = app.config['UPSTREAM_QUEUE_TIMEOUT']
+        self.base_url = app.config['UPSTREAM_BASE_URL']
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _url(self, url):
+        # Sends every call to one server instead, used to load test against a local stub
+        if not self.base_url:
+            return url
+        base = urlsplit(self.base_url)
+        parts = urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+    def get(self, url, headers=None):
+        """
+        Sends a GET to the remote API once an outbound slot is free.
+
+        Args:
+            url (str): The full URL.
+            headers (dict): Request headers, for example the API key.
+
+        Returns:
+            requests.Response: The response, or None if the call failed or timed out.
+
+        Raises:
+            UpstreamBusy: No slot was free within UPSTREAM_QUEUE_TIMEOUT.
+        """
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise UpstreamBusy(retry_after=1)
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+        try:
+            return self.session.get(self._url(url), headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            with self._lock:
+                self.failed += 1
+            logging.warning("Upstream call to %s failed: %s", urlsplit(url).netloc, e)
+            return None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def read(self):
+        """
+        Returns the outbound call counters of this worker.
+        """
+        with self._lock:
+            return {'in_flight': self.in_flight, 'calls': self.calls, 'rejected': self.rejected, 'failed': self.failed}
+
+upstream = UpstreamClient(app)
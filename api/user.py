@@ -4,6 +4,7 @@ from flask_restful import Api, Resource  # used for REST API building
 from datetime import datetime
 from __init__ import app
 from api.jwt_authorize import token_required
+from api.rate_limit import limiter
 from model.user import User
 
 # Create a Blueprint for the user API
@@ -52,15 +53,19 @@ class UserAPI:
         @token_required()
         def get(self):
             """
-            Retrieve all users.
+            Retrieve all users, optionally only the fields listed in ?fields=uid,name,role.
             """
             current_user = g.current_user
-            users = User.query.all()  # extract all users from the database
+            try:
+                fields = User.parse_fields(request.args.get('fields'))
+            except ValueError as e:
+                return {'message': str(e)}, 400
+            users = User.query_fields(fields).all()  # extract all users from the database, loading only the requested columns
 
             # Prepare a JSON list of user dictionaries
             json_ready = []
             for user in users:
-                user_data = user.read()
+                user_data = user.read(fields)
                 if current_user.role == 'Admin' or current_user.id == user.id:
                     user_data['access'] = ['rw']  # read-write access control
                 else:
@@ -174,6 +179,11 @@ class UserAPI:
                 if not password:
                     return {'message': 'Password is missing'}, 401
 
+                # Throttle before the user lookup and password hash
+                retry_after = limiter.check('authenticate', uid)
+                if retry_after:
+                    return {'message': f'Too many authentication attempts, try again in {retry_after} seconds'}, 429, {'Retry-After': str(retry_after)}
+
                 # Find user
                 user = User.query.filter_by(_uid=uid).first()
 
@@ -7,6 +7,7 @@ from __init__ import app
 from api.jwt_authorize import token_required
 from model.waypoints import Waypoints
 from model.waypointsuser import WaypointsUser
+from model.conditional import conditional
 
 """
 This Blueprint object is used to define APIs for the Waypoint model.
@@ -33,13 +34,14 @@ class WaypointAPI:
     - delete: delete a waypoint
     """
     class _GETWaypoints(Resource):
-        @token_required()
+        @token_required()  # outermost, so a request without a valid token never gets 304
+        @conditional(Waypoints, private=True)
         def get(self):
             """
-            Retrieve a single waypoint by ID.
+            Retrieve the injury catalog, or a single waypoint by ID, or 304 when the If-None-Match ETag is current.
             """
             # Obtain and validate the request data sent by the RESTful client API
-            data = request.get_json()
+            data = request.get_json(silent=True)
             if data is None or 'id' not in data:
                 waypoints = Waypoints.query.all()
                 json_waypoints = [waypoint.to_dict() for waypoint in waypoints]
@@ -159,4 +161,5 @@ class WaypointAPI:
                 return {'message': str(e)}, 500
 
     api.add_resource(_CRUD, '/waypoints')
+    api.add_resource(_GETWaypoints, '/waypoints/catalog')
     api.add_resource(_GetRating, '/waypoints/rating')
\ No newline at end of file
@@ -9,6 +9,8 @@ from model.weather import Weather
 from datetime import datetime
 from __init__ import app, db 
 from api.jwt_authorize import token_required
+from api.upstream import upstream
+from model.cache import cache
 from model.post import Post
 from flask_cors import cross_origin 
 from model.user import User
@@ -128,15 +130,17 @@ class WeatherAPI:
 
     api.add_resource(_CRUD, '/packing_checklists')
 
+@cache.cached('weather')
 def get_weather_data(lat, lon):
     
     # get the weather data for the latitude and longitude of a city
 
     api_url = weather_api_url.format(lat, lon)
-    response = requests.get(api_url, headers={'X-Api-Key': api_key})
+    response = upstream.get(api_url, headers={'X-Api-Key': api_key})
     
-    if response.status_code == requests.codes.ok:
+    if response is not None and response.status_code == requests.codes.ok:
         return response.json()
     else:
-        print("Error:", response.status_code, response.text)
+        if response is not None:
+            print("Error:", response.status_code, response.text)
         return None
\ No newline at end of file
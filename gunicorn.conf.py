@@ -0,0 +1,46 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts: gunicorn main:app
+
+With GUNICORN_PRELOAD (the default) the master imports the app and builds the prediction models and
+their data once before forking, and the workers share those pages copy-on-write instead of each
+loading its own copy. The database engine opened by the master is disposed in each worker after the
+fork, so no worker reuses a connection another process holds.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8101'
+workers = int(os.environ.get('GUNICORN_WORKERS') or 3)  # about 2 x cores + 1 for the sync worker
+# More than 1 switches to the gthread worker, so requests waiting on a remote API (weather, currency,
+# flights, trivia) do not hold a whole worker; keep DB_POOL_SIZE + DB_MAX_OVERFLOW at or above it
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or ('gthread' if threads > 1 else 'sync')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)  # seconds a request may take before its worker is restarted
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE') or 2)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 0)  # restart workers after this many requests, 0 never
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER') or 0)
+preload_app = (os.environ.get('GUNICORN_PRELOAD') or 'true').lower() == 'true'
+
+if preload_app:
+    # Build the models in the master so the workers share them, unless PRELOAD_MODELS says otherwise
+    os.environ.setdefault('PRELOAD_MODELS', 'true')
+
+if workers > 2 * multiprocessing.cpu_count() + 1:
+    print(f"gunicorn.conf.py: {workers} workers on {multiprocessing.cpu_count()} cores, consider GUNICORN_THREADS instead")
+
+def when_ready(server):
+    if preload_app:
+        # Objects loaded so far are never collected, so the collector does not write to the shared pages
+        gc.freeze()
+
+def post_fork(server, worker):
+    if not preload_app:
+        return  # the worker imports the app itself after this hook
+    from __init__ import app, db
+    from api.metrics import metrics
+    with app.app_context():
+        for engine in db.engines.values():
+            # Drop the master's pooled connections without closing them, the master still owns the sockets
+            engine.dispose(close=False)
+    metrics.record_boot()
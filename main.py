@@ -1,14 +1,15 @@
 # imports from flask
 import json
 import os
+import time
 from urllib.parse import urljoin, urlparse
 from flask import abort, redirect, render_template, request, send_from_directory, url_for, jsonify  # import render_template from "public" flask libraries
 from flask_login import current_user, login_user, logout_user
 from flask.cli import AppGroup
+import click
 from flask_login import current_user, login_required
 from flask import current_app
 from werkzeug.security import generate_password_hash
-import shutil
 from flask import Flask
 #import google.generativeai as genai
 
@@ -37,6 +38,10 @@ from api.vote import vote_api
 from api.rate import rate_api
 from api.travel import *
 from api.study import study_api
+from api.rate_limit import limiter, rate_limit_api
+from api.metrics import metrics, metrics_api
+from api.nav import nav_api
+from model.cache import cache
 
 # database Initialization functions
 from model.user import User, initUsers
@@ -55,7 +60,13 @@ from model.palomar import Palomar, initPalomarHealth
 from model.poseidon import PoseidonChatLog, initPoseidonChatLogs
 # Removed budgeting model import
 from model.socialMediaLLM import SocialMediaModel
+from model.grade_model import GradePredictionModel
 from model.study import Study, initStudies
+from model.pfp import image_build_variants, image_save, image_variant_name, image_variant_path, pfp_file_delete
+from model.blobstore import blob_gc, is_blob_key
+from model.search import rebuild_search_index
+from model.backup import export_backup, export_changes, read_manifest, restore_backup
+from model.snapshot import backup_database, copy_database, snapshot_restore, sqlite_path
 
 from api.travel.kiruthic import *
 from api.travel.aadi import *
@@ -96,6 +107,9 @@ app.register_blueprint(arhaan_api)
 app.register_blueprint(tarun_api)
 app.register_blueprint(rohan_api)
 app.register_blueprint(grade_api)
+app.register_blueprint(rate_limit_api)
+app.register_blueprint(metrics_api)
+app.register_blueprint(nav_api)
 
 # Tell Flask-Login the view function name of your login route
 login_manager.login_view = "login"
@@ -133,6 +147,11 @@ def login():
     error = None
     next_page = request.args.get('next', '') or request.form.get('next', '')
     if request.method == 'POST':
+        # Throttle before the user lookup and password hash
+        retry_after = limiter.check('login', request.form.get('username'))
+        if retry_after:
+            error = f'Too many login attempts, try again in {retry_after} seconds.'
+            return render_template("login.html", error=error, next=next_page), 429, {'Retry-After': str(retry_after)}
         user = User.query.filter_by(_uid=request.form['username']).first()
         if user and user.is_password(request.form['password']):
             login_user(user)
@@ -162,17 +181,53 @@ def index():
 def studytracker():
     return render_template("studytracker.html")
 
+# Columns rendered by the user tables, the JSON blobs are never loaded
+USER_TABLE_FIELDS = ['id', 'uid', 'name', 'email', 'role', 'pfp']
+
+# The table pages render without rows, rows are loaded on demand from /users/table/data
 @app.route('/users/table')
 @login_required
 def utable():
-    users = User.query.all()
-    return render_template("utable.html", user_data=users)
+    return render_template("utable.html")
 
 @app.route('/users/table2')
 @login_required
 def u2table():
-    users = User.query.all()
-    return render_template("u2table.html", user_data=users)
+    return render_template("u2table.html")
+
+@app.route('/users/table/data')
+@login_required
+def utable_data():
+    """
+    Return one page of users for the admin tables.
+    
+    Query parameters:
+        q: prefix to search in uid and name
+        sort, order: sort field (id, uid, name, role) and direction (asc, desc)
+        after: cursor returned as 'next' by the previous page (keyset pagination)
+        offset: rows to skip when no cursor is given (offset pagination)
+        limit: page size, at most 200
+        count: when 1, include the number of matching users as 'total'
+    """
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(200, max(1, int(request.args.get('limit', 50))))
+        query = User.query_search(request.args.get('q', '').strip(), USER_TABLE_FIELDS)
+        if current_user.role != 'Admin':
+            query = query.filter(User.id == current_user.id)  # non-admins only see themselves
+        users, cursor = User.query_page(query,
+                                        sort=request.args.get('sort', 'id'),
+                                        order=request.args.get('order', 'asc'),
+                                        after=request.args.get('after'),
+                                        offset=offset,
+                                        limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = {'users': [user.read(USER_TABLE_FIELDS) for user in users], 'next': cursor}
+    if request.args.get('count') == '1':
+        data['total'] = query.order_by(None).count()
+    return jsonify(data)
 
 @app.route('/poseidon')
 def pose_admin():
@@ -180,8 +235,24 @@ def pose_admin():
     return render_template("poseidon.html", user_data=logs)
 
 # Helper function to extract uploads for a user (ie PFP image)
+# An optional ?size= picks the smallest thumbnail covering the displayed size, as WebP when the browser accepts it
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
+    size = request.args.get('size', type=int)
+    user_uid, _, name = filename.partition('/')
+    if is_blob_key(name):
+        # Blob store files never change content, so browsers may keep them
+        webp = any(mimetype == 'image/webp' for mimetype, _ in request.accept_mimetypes)
+        path = image_variant_path(user_uid, name, size, webp)
+        response = send_from_directory(current_app.config['BLOB_FOLDER'], os.path.relpath(path, current_app.config['BLOB_FOLDER']), max_age=31536000)
+        response.vary.add('Accept')
+        return response
+    if size and name and '/' not in name:
+        webp = any(mimetype == 'image/webp' for mimetype, _ in request.accept_mimetypes)
+        variant = os.path.relpath(image_variant_path(user_uid, name, size, webp), current_app.config['UPLOAD_FOLDER'])
+        response = send_from_directory(current_app.config['UPLOAD_FOLDER'], variant)
+        response.vary.add('Accept')
+        return response
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
  
 @app.route('/users/delete/<int:user_id>', methods=['DELETE'])
@@ -314,88 +385,149 @@ def generate_data():
 
     initPalomarHealth()
     
-# Backup the old database
-def backup_database(db_uri, backup_uri):
-    """Backup the current database."""
-    if backup_uri:
-        db_path = db_uri.replace('sqlite:///', 'instance/')
-        backup_path = backup_uri.replace('sqlite:///', 'instance/')
-        shutil.copyfile(db_path, backup_path)
-        print(f"Database backed up to {backup_path}")
-    else:
-        print("Backup not supported for production database.")
-
-# Extract data from the existing database
-def extract_data():
-    data = {}
-    with app.app_context():
-        data['poseidon_chat_logs'] = [log.read() for log in PoseidonChatLog.query.all()]
-        data['users'] = [user.read() for user in User.query.all()]
-        data['sections'] = [section.read() for section in Section.query.all()]
-        data['groups'] = [group.read() for group in Group.query.all()]
-        data['channels'] = [channel.read() for channel in Channel.query.all()]
-        data['posts'] = [post.read() for post in Post.query.all()]
-        data['rates'] = [rate.read() for rate in Rate.query.all()]
-        data['waypoints'] = [waypoints.read() for waypoints in Waypoints.query.all()]
-        data['waypointsuser'] = [waypointsuser.read() for waypointsuser in WaypointsUser.query.all()]
-        data['hotels'] = [hotel.read() for hotel in Hotel.query.all()]
-        data['flights'] = [flight.read() for flight in Flight.query.all()]
-        data['hotel_data'] = [hotel.read() for hotel in Hotel.query.all()]
-        data['packing_checklists'] = [item.read() for item in Weather.query.all()]
-        # Removed budgeting data extraction
-    return data
-
-# Save extracted data to JSON files
-def save_data_to_json(data, directory='backup'):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    for table, records in data.items():
-        with open(os.path.join(directory, f'{table}.json'), 'w') as f:
-            json.dump(records, f)
-    print(f"Data backed up to {directory} directory.")
-
-# Load data from JSON files
-def load_data_from_json(directory='backup'):
-    data = {}
-    for table in ['poseidon_chat_logs','users', 'sections', 'groups', 'channels', 'posts', 'hotel_data', 'flights','waypoints', 'waypointsuser', 'packing_checklists', 'rates']:
-        with open(os.path.join(directory, f'{table}.json'), 'r') as f:
-            data[table] = json.load(f)
-    return data
-
-# Restore data to the new database
-def restore_data(data):
-    with app.app_context():
-        _ = PoseidonChatLog.restore(data['poseidon_chat_logs'])
-        users = User.restore(data['users'])
-        _ = Section.restore(data['sections'])
-        _ = Group.restore(data['groups'], users)
-        _ = Channel.restore(data['channels'])
-        # _ = Post.restore(data['posts'])
-        _ = Rate.restore(data['rates'])
-        _ = Hotel.restore(data['hotel_data'])
-        # _ = Budgeting.restore(data['budgeting_data']) # Removed budgeting restore
-        _ = Flight.restore(data['flights'])
-        _ = Waypoints.restore(data['waypoints'])
-        _ = WaypointsUser.restore(data['waypointsuser'])
-        _ = Weather.restore(data['packing_checklists'])
-
-    print("Data restored to the new database.")
-
 # Define a command to backup data
 @custom_cli.command('backup_data')
-def backup_data():
-    data = extract_data()
-    save_data_to_json(data)
-    backup_database(app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_BACKUP_URI'])
+@click.option('--compression', type=click.Choice(['gzip', 'zstd']), default=None, help='Compress each table file, defaults to BACKUP_COMPRESSION.')
+@click.option('--batch-size', type=int, default=None, help='Rows loaded per query, defaults to BACKUP_BATCH_SIZE.')
+@click.option('--workers', type=int, default=None, help='Tables exported at the same time, defaults to BACKUP_WORKERS.')
+@click.option('--incremental', is_flag=True, help='Export only the rows changed since the last backup, and snapshot only the changed database pages.')
+def backup_data(compression, batch_size, workers, incremental):
+    options = dict(
+        compression=compression or app.config['BACKUP_COMPRESSION'],
+        batch_size=batch_size or app.config['BACKUP_BATCH_SIZE'],
+        workers=workers or app.config['BACKUP_WORKERS'],
+        overlap=app.config['BACKUP_CHANGE_OVERLAP'],
+    )
+    if incremental and read_manifest('backup'):
+        manifest = export_changes('backup', **options)
+        rows = sum(entry['rows'] for entry in manifest['tables'].values())
+        deletes = sum(len(keys) for keys in manifest['deletes'].values())
+        if manifest['tables'] or manifest['deletes']:
+            print(f"Changes up to {manifest['watermark']} backed up: {rows} rows written, {deletes} deleted.")
+        else:
+            print("No data changed since the last backup.")
+    else:
+        manifest = export_backup('backup', **options)
+        rows = sum(entry['rows'] for entry in manifest['tables'].values())
+        print(f"Data backed up to backup directory: {len(manifest['tables'])} tables, {rows} rows in {manifest['seconds']}s.")
+    backup_database(app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_BACKUP_URI'], incremental=incremental)
 
 # Define a command to restore data
 @custom_cli.command('restore_data')
-def restore_data_command():
-    data = load_data_from_json()
-    restore_data(data)
+@click.option('--chunk-size', type=int, default=None, help='Records written per transaction, defaults to BACKUP_BATCH_SIZE.')
+def restore_data_command(chunk_size):
+    def progress(table, done):
+        print(f"\r  {table}: {done} records", end='', flush=True)
+    def report(line):
+        print(f"\r{line:<60}")
+    restore_backup('backup', chunk_size=chunk_size or app.config['BACKUP_BATCH_SIZE'], progress=progress, report=report)
+    cache.invalidate_models()  # some restored rows are written without the ORM
+    print(f"Indexed {rebuild_search_index()} posts for search.")  # restored posts bypass the indexing on flush
+    print("Data restored to the new database.")
+
+# Define a command to rebuild a database file from the snapshot and its incremental deltas
+@custom_cli.command('restore_snapshot')
+@click.argument('output')
+def restore_snapshot(output):
+    backup_uri = app.config['SQLALCHEMY_BACKUP_URI']
+    if not backup_uri:
+        print("Snapshots not supported for production database.")
+        return
+    snapshot_restore(sqlite_path(backup_uri), output)
+    cache.invalidate_models()  # the file may replace the live database
+    print(f"Snapshot written to {output}.")
+
+# Define a command to refresh the local SQLite stand-in for the read replica from the primary
+@custom_cli.command('sync_replica')
+def sync_replica():
+    replica_uri = app.config.get('SQLALCHEMY_BINDS', {}).get('replica')
+    if not (replica_uri and replica_uri.startswith('sqlite:///') and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///')):
+        print("sync_replica only refreshes a SQLite replica of a SQLite database, set DB_REPLICA_URI.")
+        return
+    db.engines['replica'].dispose()  # close pooled connections to the file being replaced
+    copy_database(sqlite_path(app.config['SQLALCHEMY_DATABASE_URI']), sqlite_path(replica_uri),
+                  pages=app.config['SQLITE_BACKUP_PAGES'], sleep=app.config['SQLITE_BACKUP_SLEEP'])
+    cache.invalidate_models()  # responses read from the replica change with it
+    print(f"Replica {sqlite_path(replica_uri)} refreshed from the primary.")
+
+# Define a command to build thumbnails and WebP variants for images uploaded before the image pipeline
+@custom_cli.command('build_image_variants')
+def build_image_variants():
+    upload_folder = app.config['UPLOAD_FOLDER']
+    count = 0
+    for user_uid in sorted(os.listdir(upload_folder)):
+        user_dir = os.path.join(upload_folder, user_uid)
+        if not os.path.isdir(user_dir):
+            continue
+        names = set(os.listdir(user_dir))
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in app.config['UPLOAD_EXTENSIONS']:
+                continue
+            if image_variant_name(name, webp=True) in names:
+                continue  # variants already built
+            image_build_variants(os.path.join(user_dir, name))
+            count += 1
+    print(f"Built image variants for {count} uploads.")
+
+# Define a command to move pictures from the per-user upload directories into the blob store
+@custom_cli.command('migrate_uploads')
+def migrate_uploads():
+    moved = 0
+    for user in User.query.all():
+        for attribute in ('pfp', 'car'):
+            filename = getattr(user, attribute)
+            if not filename or is_blob_key(filename):
+                continue
+            legacy_path = os.path.join(app.config['UPLOAD_FOLDER'], user.uid, filename)
+            if not os.path.isfile(legacy_path):
+                continue
+            with open(legacy_path, 'rb') as legacy_file:
+                key = image_save(legacy_file.read(), filename)
+            setattr(user, attribute, key)
+            db.session.commit()
+            pfp_file_delete(user.uid, filename)  # removes the legacy file and its variants
+            moved += 1
+    print(f"Moved {moved} uploads into the blob store.")
+
+# Define a command to remove blobs that no user refers to
+@custom_cli.command('gc_blobs')
+@click.option('--grace', default=3600, help='Keep blobs modified within this many seconds.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def gc_blobs(grace, dry_run):
+    referenced = set()
+    for pfp, car in db.session.query(User._pfp, User._car):
+        referenced.update(key for key in (pfp, car) if key)
+    result = blob_gc(referenced, grace_seconds=grace, dry_run=dry_run)
+    action = "Would remove" if dry_run else "Removed"
+    print(f"{action} {result['removed_files']} files ({result['removed_bytes']} bytes), kept {result['kept_files']}.")
+
+# Define a command to clear cache namespaces in every worker, or drop expired shared entries
+@custom_cli.command('clear_cache')
+@click.argument('namespaces', nargs=-1)
+def clear_cache(namespaces):
+    if namespaces:
+        cache.invalidate(*namespaces)
+        print(f"Invalidated {', '.join(namespaces)}.")
+    else:
+        print(f"Removed {cache.purge()} expired entries.")
+
+# Define a command to index every post for search again, after bulk writes or a change to the indexing
+@custom_cli.command('rebuild_search')
+@click.option('--batch-size', type=int, default=1000, help='Posts indexed per statement.')
+def rebuild_search(batch_size):
+    start = time.perf_counter()
+    count = rebuild_search_index(batch_size)
+    print(f"Indexed {count} posts for search in {time.perf_counter() - start:.2f}s.")
 
 # Register the custom command group with the Flask application
 app.cli.add_command(custom_cli)
+
+# Build the prediction models now rather than on their first request, when configured
+if app.config['PRELOAD_MODELS']:
+    SocialMediaModel.get_instance()
+    GradePredictionModel.get_instance()
+
+metrics.record_boot()
         
 # this runs the flask application on the development server
 if __name__ == "__main__":
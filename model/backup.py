@@ -0,0 +1,585 @@
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from sqlalchemy import delete, event, func, inspect, insert, select, update
+from werkzeug.security import generate_password_hash
+from __init__ import app, db
+from model.user import User
+from model.section import Section
+from model.group import Group, group_moderators
+from model.channel import Channel
+from model.post import Post
+from model.rate import Rate
+from model.waypoints import Waypoints
+from model.waypointsuser import WaypointsUser
+from model.flight_api_post import Flight
+from model.hotel import Hotel
+from model.weather import Weather
+from model.poseidon import PoseidonChatLog
+
+"""
+Streaming backup of the database to newline-delimited JSON.
+
+Each table is walked in primary key order, one batch at a time, and every batch is written as one JSON
+record per line before the next batch is loaded, so memory stays flat however large the table grows.
+Tables are exported in parallel, each in its own application context and session. A manifest.json
+written after all tables records the file, row count and SHA-256 of the uncompressed content of each
+table, which the loader checks before handing the records to restore.
+
+Restore matches backup records to existing rows by a natural key, such as a user's uid, using one query
+per table, and writes the differences with bulk INSERT and UPDATE statements committed per chunk. Tables
+are restored parents first, and foreign keys are translated from the ids in the backup to the ids of the
+matching rows in this database.
+
+Writes made through the ORM to the backed up tables are recorded in the backup_changes table, in the same
+transaction as the write. A full backup stores the last change number as its watermark; an incremental
+backup exports only the rows changed after the previous watermark into a delta-<n> directory, and
+restore replays the full backup and then each delta in order. Change numbers are taken when a change is
+written, not when it commits, so on MySQL a transaction can commit a number below a watermark already
+read. Each backup therefore also lists the numbers it saw in the overlap window below its watermark, and
+the next delta exports any change in that window it does not list. Changes are kept until they fall out
+of the window, and a transaction that commits more than BACKUP_CHANGE_OVERLAP changes late is missed.
+Writes made outside the ORM, with bulk statements or another SQLite client, are not recorded, and need a
+full backup.
+
+The backup_changes table is created by db.create_all() and by the first full backup, so a database from
+before it needs one full backup before incremental backups can start; until the table exists, writes are
+committed without being recorded.
+"""
+
+# Backup name and model of each table, in the order restore needs them
+BACKUP_TABLES = [
+    ('poseidon_chat_logs', PoseidonChatLog),
+    ('users', User),
+    ('sections', Section),
+    ('groups', Group),
+    ('channels', Channel),
+    ('posts', Post),
+    ('rates', Rate),
+    ('waypoints', Waypoints),
+    ('waypointsuser', WaypointsUser),
+    ('hotel_data', Hotel),
+    ('flights', Flight),
+    ('packing_checklists', Weather),
+]
+
+# How each table is restored: the natural key column matched against existing rows, the column each
+# backup field is stored in, and the backup table each foreign key column refers to. Posts are not
+# restored, their backup records carry user and channel names rather than ids.
+RESTORE_TABLES = {
+    'poseidon_chat_logs': (PoseidonChatLog, '_question', {'question': '_question', 'response': '_response'}, {}),
+    'users': (User, '_uid', {'uid': '_uid', 'name': '_name', 'email': '_email', 'role': '_role', 'pfp': '_pfp',
+                             'car': '_car', 'grade_data': '_grade_data', 'ap_exam': '_ap_exam'}, {}),
+    'sections': (Section, '_name', {'name': '_name', 'theme': '_theme'}, {}),
+    'groups': (Group, '_name', {'name': '_name', 'section_id': '_section_id'}, {'_section_id': 'sections'}),
+    'channels': (Channel, '_name', {'name': '_name', 'attributes': '_attributes', 'group_id': '_group_id'},
+                 {'_group_id': 'groups'}),
+    'rates': (Rate, 'id', {'id': 'id', 'value': 'value', 'user_id': 'user_id', 'post_id': 'post_id'},
+              {'user_id': 'users'}),
+    'hotel_data': (Hotel, 'hotel', {'user_id': 'user_id', 'hotel': 'hotel', 'city': 'city', 'country': 'country',
+                                    'rating': 'rating', 'note': 'note'}, {'user_id': 'users'}),
+    'flights': (Flight, 'origin', {'origin': 'origin', 'destination': 'destination', 'note': 'note'}, {}),
+    'waypoints': (Waypoints, '_injury', {'injury': '_injury', 'location': '_location', 'notes': '_notes'}, {}),
+    'waypointsuser': (WaypointsUser, '_injury', {'injury': '_injury', 'location': '_location', 'address': '_address',
+                                                 'rating': '_rating', 'user_id': '_user_id'}, {'_user_id': 'users'}),
+    'packing_checklists': (Weather, 'id', {'id': 'id', 'item': 'item', 'user_id': 'user_id'}, {'user_id': 'users'}),
+}
+
+MANIFEST = 'manifest.json'
+DELTA_PREFIX = 'delta-'
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+class BackupChange(db.Model):
+    """
+    BackupChange Model
+
+    One row per ORM insert, update or delete of a backed up row, numbered in the order the changes were
+    written. Concurrent transactions can commit their numbers out of that order.
+
+    Attributes:
+        seq (db.Column): The change number, the watermark of incremental backups.
+        table (db.Column): The backup name of the table.
+        row_id (db.Column): The id of the changed row.
+        key (db.Column): The JSON encoded natural key of the row, used to replay deletes.
+        op (db.Column): 'upsert' or 'delete'.
+    """
+    __tablename__ = 'backup_changes'
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    table = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.Text, nullable=True)
+    op = db.Column(db.String(8), nullable=False)
+
+_TRACKED = {model: name for name, model in BACKUP_TABLES}
+_changes_exist = False  # set once this process has seen the backup_changes table
+
+def _has_changes_table(connection):
+    global _changes_exist
+    if not _changes_exist:
+        _changes_exist = inspect(connection).has_table(BackupChange.__tablename__)
+    return _changes_exist
+
+@event.listens_for(db.session, 'after_flush')
+def _record_changes(session, flush_context):
+    # Runs inside the flush transaction, so a change is recorded exactly when its write commits
+    changes = []
+    for op, objects in (('upsert', session.new), ('upsert', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            name = _TRACKED.get(type(obj))
+            if name is None or (objects is session.dirty and not session.is_modified(obj)):
+                continue
+            key_name = RESTORE_TABLES[name][1] if name in RESTORE_TABLES else 'id'
+            state = inspect(obj)
+            changes.append({'table': name, 'row_id': state.identity[0] if state.identity else obj.id,
+                            'key': json.dumps(state.dict.get(key_name)), 'op': op})
+    if changes and _has_changes_table(session.connection()):
+        session.connection().execute(insert(BackupChange.__table__), changes)
+
+def change_watermark():
+    """
+    Returns the number of the last recorded change, 0 when there is none.
+    """
+    return db.session.execute(select(func.coalesce(func.max(BackupChange.seq), 0))).scalar()
+
+def _zstandard():
+    # zstandard is optional, only needed for zstd compressed backups
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression requires the zstandard package, install it or use gzip")
+    return zstandard
+
+def _open_write(path, compression, stack):
+    if compression == 'gzip':
+        return stack.enter_context(gzip.open(path, 'wb', compresslevel=6))
+    raw = stack.enter_context(open(path, 'wb'))
+    if compression == 'zstd':
+        return stack.enter_context(_zstandard().ZstdCompressor(level=3).stream_writer(raw, closefd=False))
+    return raw
+
+def _open_read(path, compression, stack):
+    if compression == 'gzip':
+        return stack.enter_context(gzip.open(path, 'rb'))
+    raw = stack.enter_context(open(path, 'rb'))
+    if compression == 'zstd':
+        return io.BufferedReader(stack.enter_context(_zstandard().ZstdDecompressor().stream_reader(raw)))
+    return raw
+
+def export_table(name, model, directory, compression=None, batch_size=1000, ids=None):
+    """
+    Writes one table to <directory>/<name>.jsonl, compressed when requested.
+
+    Rows are read in batches of batch_size ordered by id, each batch starting after the last id of the
+    previous one, and the session is cleared after every batch so loaded rows do not accumulate.
+    When ids is given only those rows are written, batch_size ids per query.
+
+    Args:
+        name (str): The backup name of the table.
+        model (db.Model): The model whose read() output is exported.
+        directory (str): The backup directory.
+        compression (str, optional): None, 'gzip' or 'zstd'.
+        batch_size (int): The number of rows loaded per query.
+        ids (list, optional): The sorted ids of the rows to export. Defaults to every row.
+
+    Returns:
+        dict: The manifest entry of the table.
+    """
+    filename = f'{name}.jsonl{COMPRESSION_EXTENSIONS[compression]}'
+    path = os.path.join(directory, filename)
+    tmp_path = f'{path}.tmp'
+    digest = hashlib.sha256()
+    rows = 0
+    with app.app_context():
+        with ExitStack() as stack:
+            out = _open_write(tmp_path, compression, stack)
+            last_id, offset = 0, 0
+            while True:
+                if ids is None:
+                    batch = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+                elif offset < len(ids):
+                    batch = model.query.filter(model.id.in_(ids[offset:offset + batch_size])).order_by(model.id).all()
+                    offset += batch_size
+                    if not batch:
+                        continue  # rows deleted since the change was recorded
+                else:
+                    batch = []
+                if not batch:
+                    break
+                # Models with read_many() read the related rows of a batch together rather than per row
+                records = model.read_many(batch) if hasattr(model, 'read_many') else [row.read() for row in batch]
+                chunk = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+                digest.update(chunk)
+                out.write(chunk)
+                rows += len(batch)
+                last_id = batch[-1].id
+                db.session.expunge_all()
+        db.session.remove()
+    os.replace(tmp_path, path)
+    # Drop files of this table left by an earlier backup in another format
+    for stale in [f'{name}.json'] + [f'{name}.jsonl{ext}' for ext in COMPRESSION_EXTENSIONS.values()]:
+        if stale != filename and os.path.exists(os.path.join(directory, stale)):
+            os.remove(os.path.join(directory, stale))
+    return {'file': filename, 'rows': rows, 'sha256': digest.hexdigest(), 'bytes': os.path.getsize(path)}
+
+def export_backup(directory='backup', compression=None, batch_size=1000, workers=4, tables=None, overlap=1000):
+    """
+    Exports tables in parallel and writes the manifest once every table is complete.
+
+    Args:
+        directory (str): The backup directory, created if missing.
+        compression (str, optional): None, 'gzip' or 'zstd'.
+        batch_size (int): The number of rows loaded per query.
+        workers (int): The number of tables exported at the same time.
+        tables (list, optional): The (name, model) pairs to export. Defaults to BACKUP_TABLES.
+        overlap (int): The change numbers below the watermark checked again for late commits by the next delta.
+
+    Returns:
+        dict: The manifest.
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}', use gzip or zstd")
+    if compression == 'zstd':
+        _zstandard()  # fail before any table is written
+    tables = tables or BACKUP_TABLES
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    BackupChange.__table__.create(db.engine, checkfirst=True)  # changes are recorded from this backup on
+    # Rows changed while the tables are exported are past the watermark, and go in the next delta
+    watermark = change_watermark()
+    recent = _recent_changes(watermark, overlap)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(name, pool.submit(export_table, name, model, directory, compression, batch_size))
+                   for name, model in tables]
+        entries = {name: future.result() for name, future in futures}
+
+    manifest = {
+        'format': 'ndjson',
+        'version': 1,
+        'kind': 'full',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'compression': compression,
+        'watermark': watermark,
+        'recent': recent,
+        'seconds': round(time.perf_counter() - start, 3),
+        'tables': entries,
+    }
+    _write_manifest(directory, manifest)
+    # The deltas of the previous full backup no longer apply
+    for delta_dir in backup_deltas(directory):
+        for path in glob.glob(os.path.join(delta_dir, '*')):
+            os.remove(path)
+        os.rmdir(delta_dir)
+    _prune_changes(watermark, overlap)
+    return manifest
+
+def _write_manifest(directory, manifest):
+    tmp_path = os.path.join(directory, f'{MANIFEST}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+def _recent_changes(watermark, overlap):
+    # The change numbers committed in the overlap window, listed in the manifest so the next delta can find late ones
+    return db.session.execute(select(BackupChange.seq).where(BackupChange.seq > watermark - overlap,
+                                                             BackupChange.seq <= watermark)).scalars().all()
+
+def _prune_changes(watermark, overlap):
+    # Changes below the overlap window are in a backup now; the window is kept to find late commits in
+    db.session.execute(delete(BackupChange).where(BackupChange.seq <= watermark - overlap))
+    db.session.commit()
+
+def backup_deltas(directory='backup'):
+    """
+    Returns the delta directories of a backup in the order they are replayed.
+    """
+    return sorted(path for path in glob.glob(os.path.join(directory, f'{DELTA_PREFIX}*')) if os.path.isdir(path))
+
+def export_changes(directory='backup', compression=None, batch_size=1000, workers=4, overlap=1000):
+    """
+    Exports the rows changed since the last full or incremental backup as the next delta of the backup.
+
+    The changes after the previous watermark are exported, with the changes in the overlap window below it
+    that the previous backup did not see because they committed after it. Exporting a row again is harmless,
+    restore writes its current values either way.
+
+    Args:
+        directory (str): The backup directory holding a full backup.
+        compression (str, optional): None, 'gzip' or 'zstd'.
+        batch_size (int): The number of rows loaded per query.
+        workers (int): The number of tables exported at the same time.
+        overlap (int): The change numbers below each watermark checked again for late commits.
+
+    Returns:
+        dict: The manifest of the delta, with no tables when nothing changed.
+
+    Raises:
+        ValueError: The directory has no full backup to add a delta to.
+    """
+    base = read_manifest(directory)
+    if not base or 'watermark' not in base or not _has_changes_table(db.session.connection()):
+        raise ValueError(f"{directory} has no full backup with a watermark, run a full backup first")
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}', use gzip or zstd")
+    deltas = backup_deltas(directory)
+    previous = read_manifest(deltas[-1]) if deltas else base
+    since = previous['watermark']
+    seen = set(previous.get('recent', []))  # backups written before the window was kept list none, so all are checked
+    start = time.perf_counter()
+    watermark = change_watermark()
+    recent = _recent_changes(watermark, overlap)
+
+    # The last change of a row decides whether it is written or deleted
+    last_ops = {}
+    for seq, table, row_id, key, op in db.session.execute(
+            select(BackupChange.seq, BackupChange.table, BackupChange.row_id, BackupChange.key, BackupChange.op)
+            .where(BackupChange.seq > since - overlap, BackupChange.seq <= watermark).order_by(BackupChange.seq)):
+        if seq > since or seq not in seen:
+            last_ops[(table, row_id)] = (op, key)
+    upserts, deletes = {}, {}
+    for (table, row_id), (op, key) in last_ops.items():
+        if op == 'delete':
+            deletes.setdefault(table, []).append(json.loads(key))
+        else:
+            upserts.setdefault(table, []).append(row_id)
+
+    manifest = {
+        'format': 'ndjson',
+        'version': 1,
+        'kind': 'delta',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'compression': compression,
+        'since': since,
+        'watermark': watermark,
+        'recent': recent,
+        'tables': {},
+        'deletes': deletes,
+    }
+    if last_ops:
+        delta_dir = os.path.join(directory, f'{DELTA_PREFIX}{len(deltas) + 1:04d}')
+        os.makedirs(delta_dir, exist_ok=True)
+        tables = [(name, model) for name, model in BACKUP_TABLES if name in upserts]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [(name, pool.submit(export_table, name, model, delta_dir, compression, batch_size,
+                                          sorted(upserts[name]))) for name, model in tables]
+            manifest['tables'] = {name: future.result() for name, future in futures}
+        manifest['seconds'] = round(time.perf_counter() - start, 3)
+        _write_manifest(delta_dir, manifest)
+    _prune_changes(watermark, overlap)
+    return manifest
+
+def read_manifest(directory='backup'):
+    """
+    Returns the manifest of a backup directory, or None for a backup in the older one file per table format.
+    """
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def iter_table(directory, name, manifest):
+    """
+    Yields the records of one table from a backup, one line at a time.
+
+    The row count and checksum are checked once the file has been read to the end.
+
+    Raises:
+        ValueError: The file does not match its manifest entry.
+    """
+    entry = manifest['tables'][name]
+    digest = hashlib.sha256()
+    rows = 0
+    with ExitStack() as stack:
+        source = _open_read(os.path.join(directory, entry['file']), manifest.get('compression'), stack)
+        for line in source:
+            digest.update(line)
+            rows += 1
+            yield json.loads(line)
+    if rows != entry['rows'] or digest.hexdigest() != entry['sha256']:
+        raise ValueError(f"Backup of {name} is corrupt: expected {entry['rows']} rows with sha256 "
+                         f"{entry['sha256']}, read {rows} rows with sha256 {digest.hexdigest()}")
+
+def iter_records(directory, name, manifest):
+    """
+    Yields the records of one table from a backup in either format.
+
+    Args:
+        directory (str): The backup directory.
+        name (str): The backup name of the table.
+        manifest (dict): The manifest from read_manifest, or None for a backup with one JSON array per table.
+    """
+    if manifest:
+        yield from iter_table(directory, name, manifest)
+    else:
+        with open(os.path.join(directory, f'{name}.json'), 'r') as f:
+            yield from json.load(f)
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def restore_table(name, records, id_maps, chunk_size=1000, progress=None):
+    """
+    Inserts the backup records of one table that have no matching row and updates the ones that do.
+
+    Args:
+        name (str): The backup name of the table, a key of RESTORE_TABLES.
+        records (iterable): The backup records.
+        id_maps (dict): Backup id to restored id for each table restored so far, extended with this table.
+        chunk_size (int): The number of records written per transaction.
+        progress (callable, optional): Called with the table name and the records done after each chunk.
+
+    Returns:
+        dict: The number of records read, rows inserted and rows updated.
+    """
+    model, key_name, columns, foreign_keys = RESTORE_TABLES[name]
+    key_column = getattr(model, key_name)
+    existing = dict(db.session.execute(select(key_column, model.id)).all())
+    id_map = id_maps.setdefault(name, {})
+    defaults = {}
+    result = {'records': 0, 'inserted': 0, 'updated': 0}
+
+    for chunk in _chunks(records, chunk_size):
+        inserts, updates, backup_ids = {}, {}, {}
+        for record in chunk:
+            values = {column: record[field] for field, column in columns.items() if field in record}
+            for column, table in foreign_keys.items():
+                if values.get(column) is not None:
+                    values[column] = id_maps.get(table, {}).get(values[column], values[column])
+            key = values.get(key_name, record.get('id'))
+            backup_ids.setdefault(key, []).append(record.get('id'))
+            # A key repeated in the backup is written once, with its last record
+            if key in existing:
+                updates[key] = {**values, 'id': existing[key]}
+            else:
+                if model is User and not defaults:
+                    # Restored users get the default password, hashed once rather than once per user
+                    defaults['_password'] = generate_password_hash(app.config["DEFAULT_PASSWORD"], "pbkdf2:sha256", salt_length=10)
+                inserts[key] = {**defaults, **values}
+        try:
+            if inserts:
+                db.session.execute(insert(model), list(inserts.values()))
+                existing.update(db.session.execute(
+                    select(key_column, model.id).where(key_column.in_(list(inserts)))).all())
+            if updates:
+                db.session.execute(update(model), list(updates.values()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for key, ids in backup_ids.items():
+            for backup_id in ids:
+                if backup_id is not None:
+                    id_map[backup_id] = existing[key]
+        result['records'] += len(chunk)
+        result['inserted'] += len(inserts)
+        result['updated'] += len(updates)
+        if progress:
+            progress(name, result['records'])
+    return result
+
+def restore_moderators(records, id_maps):
+    """
+    Adds the group moderators listed in the backup that are missing from this database.
+
+    Returns:
+        int: The number of moderator links added.
+    """
+    groups, users = id_maps.get('groups', {}), id_maps.get('users', {})
+    wanted = {(groups[record['id']], users.get(user_id, user_id))
+              for record in records if record.get('id') in groups
+              for user_id in record.get('moderators') or []}
+    if not wanted:
+        return 0
+    existing = set(db.session.execute(select(group_moderators.c.group_id, group_moderators.c.user_id)).all())
+    missing = [{'group_id': group_id, 'user_id': user_id} for group_id, user_id in wanted - existing]
+    if missing:
+        db.session.execute(insert(group_moderators), missing)
+        db.session.commit()
+    return len(missing)
+
+def restore_deletes(name, keys, chunk_size=1000):
+    """
+    Deletes the rows of one table whose natural key is in keys.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    model, key_name, _, _ = RESTORE_TABLES[name]
+    deleted = 0
+    for chunk in _chunks(keys, chunk_size):
+        deleted += db.session.execute(delete(model).where(getattr(model, key_name).in_(chunk))).rowcount
+        db.session.commit()
+    return deleted
+
+def restore_backup(directory='backup', chunk_size=1000, progress=None, report=print):
+    """
+    Restores a backup into the current database, the full backup and then each delta in order.
+
+    Within a backup, tables are restored parents before the tables that refer to them, and deletes of a
+    delta are applied children first before its rows are written. Every table of the full backup and the
+    deltas is checked against its manifest before any of it is written. Each chunk of a table is
+    committed on its own, so an error leaves the chunks before it restored.
+
+    Args:
+        directory (str): The backup directory.
+        chunk_size (int): The number of records written per transaction.
+        progress (callable, optional): Called with the table name and the records done after each chunk.
+        report (callable): Called with a summary line for each table.
+
+    Returns:
+        dict: The restore result of each table, summed over the full backup and the deltas.
+    """
+    manifest = read_manifest(directory)
+    order = {table.name: index for index, table in enumerate(db.metadata.sorted_tables)}
+    names = sorted(RESTORE_TABLES, key=lambda name: order[RESTORE_TABLES[name][0].__table__.name])
+    steps = [(directory, manifest)] + [(delta_dir, read_manifest(delta_dir)) for delta_dir in backup_deltas(directory)]
+    for step_dir, step_manifest in steps:
+        if step_manifest:
+            for name in names:
+                if name in step_manifest['tables']:
+                    for _ in iter_table(step_dir, name, step_manifest):
+                        pass  # raises ValueError if the table does not match the manifest
+
+    id_maps, results = {}, {}
+    start = time.perf_counter()
+    for step_dir, step_manifest in steps:
+        if step_manifest and step_manifest.get('kind') == 'delta':
+            report(f"Replaying {os.path.basename(step_dir)}, changes up to {step_manifest['watermark']}")
+            for name in reversed(names):
+                if step_manifest['deletes'].get(name):
+                    deleted = restore_deletes(name, step_manifest['deletes'][name], chunk_size)
+                    total = results.setdefault(name, {'records': 0, 'inserted': 0, 'updated': 0})
+                    total['deleted'] = total.get('deleted', 0) + deleted
+                    report(f"{name}: {deleted} deleted")
+        for name in names:
+            if step_manifest and name not in step_manifest['tables']:
+                continue
+            table_start = time.perf_counter()
+            result = restore_table(name, iter_records(step_dir, name, step_manifest), id_maps, chunk_size, progress)
+            if name == 'groups':
+                result['moderators'] = restore_moderators(iter_records(step_dir, name, step_manifest), id_maps)
+            seconds = time.perf_counter() - table_start
+            report(f"{name}: {result['records']} records, {result['inserted']} inserted, {result['updated']} "
+                   f"updated in {seconds:.2f}s ({result['records'] / seconds if seconds else 0:.0f} records/s)")
+            total = results.setdefault(name, {'records': 0, 'inserted': 0, 'updated': 0})
+            for counter, value in result.items():
+                total[counter] = total.get(counter, 0) + value
+    total = sum(result['records'] for result in results.values())
+    seconds = time.perf_counter() - start
+    report(f"Restored {total} records in {seconds:.2f}s ({total / seconds if seconds else 0:.0f} records/s).")
+    return results
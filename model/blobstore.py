@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from __init__ import app
+
+"""
+Content-addressed store for uploaded files.
+
+Each file is stored once under the SHA-256 of its content, in BLOB_FOLDER/<first two hex digits>/<digest><ext>.
+Records refer to a file by its key, the digest plus extension such as '3f1a...9c.png', so identical uploads
+share one file, and renaming a user is a metadata change only. Files derived from a blob, such as image
+thumbnails, are stored next to it with the digest as prefix. Blobs that no record refers to are removed by
+blob_gc.
+"""
+
+BLOB_KEY = re.compile(r'^([0-9a-f]{64})(\.[A-Za-z0-9]+)$')
+BLOB_FILE = re.compile(r'^([0-9a-f]{64})[._]')
+
+def is_blob_key(name):
+    """
+    Checks whether a stored filename is a blob key rather than a legacy per-user filename.
+
+    Args:
+        name (str): The filename stored on a record.
+
+    Returns:
+        bool: True if the name is a blob key.
+    """
+    return bool(name) and BLOB_KEY.match(name) is not None
+
+def blob_digest(key):
+    """
+    Returns the SHA-256 hex digest part of a blob key.
+    """
+    return BLOB_KEY.match(key).group(1)
+
+def blob_path(key):
+    """
+    Returns the path of a blob, or of a file derived from it, in the store.
+
+    Args:
+        key (str): The blob key, or a derived filename that starts with the digest.
+
+    Returns:
+        str: The path inside BLOB_FOLDER.
+    """
+    return os.path.join(app.config['BLOB_FOLDER'], key[:2], key)
+
+def blob_put(data, ext):
+    """
+    Stores bytes in the blob store unless a blob with the same content already exists.
+
+    Args:
+        data (bytes): The content to store.
+        ext (str): The file extension including the dot, for example '.png'.
+
+    Returns:
+        tuple: The blob key and True if the blob was written, False if it already existed.
+    """
+    key = hashlib.sha256(data).hexdigest() + ext.lower()
+    path = blob_path(key)
+    if os.path.exists(path):
+        # Refresh the mtime so a concurrent garbage collection treats the blob as new
+        os.utime(path)
+        return key, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename so readers never see a partly written blob
+    tmp_path = f'{path}.tmp{os.getpid()}.{threading.get_ident()}'
+    with open(tmp_path, 'wb') as blob_file:
+        blob_file.write(data)
+    os.replace(tmp_path, path)
+    return key, True
+
+def blob_gc(referenced, grace_seconds=3600, dry_run=False):
+    """
+    Removes blobs, and the files derived from them, that no record refers to.
+
+    Blobs modified within the grace period are kept, which covers uploads whose record has not been
+    committed yet.
+
+    Args:
+        referenced (set): The blob keys still referred to by records.
+        grace_seconds (int): The minimum age in seconds of a blob before it can be removed. Defaults to one hour.
+        dry_run (bool): When True, only report what would be removed.
+
+    Returns:
+        dict: The number of files and bytes removed, and the number of files kept.
+    """
+    digests = {blob_digest(key) for key in referenced if is_blob_key(key)}
+    cutoff = time.time() - grace_seconds
+    result = {'removed_files': 0, 'removed_bytes': 0, 'kept_files': 0}
+    root = app.config['BLOB_FOLDER']
+    if not os.path.isdir(root):
+        return result
+    for shard in sorted(os.listdir(root)):
+        shard_dir = os.path.join(root, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in sorted(os.listdir(shard_dir)):
+            path = os.path.join(shard_dir, name)
+            match = BLOB_FILE.match(name)
+            stat = os.stat(path)
+            if (match and match.group(1) in digests) or stat.st_mtime > cutoff:
+                result['kept_files'] += 1
+                continue
+            if not dry_run:
+                os.remove(path)
+            result['removed_files'] += 1
+            result['removed_bytes'] += stat.st_size
+    return result
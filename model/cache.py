@@ -0,0 +1,347 @@
+import functools
+import logging
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_request_context
+from sqlalchemy import event
+
+"""
+Two-tier cache shared by the gunicorn workers.
+
+Values are looked up in a per-process LRU first, then in a shared SQLite file every worker on the host
+opens, and are computed only when neither has them. Keys live in namespaces, each with its own TTL from
+CACHE_TTLS. Every namespace has a generation number kept in the shared file; invalidating a namespace
+bumps it, and entries stored under an older generation are ignored by every worker from its next request
+on. Namespaces can be tied to models, so committing a change to one of their rows invalidates them.
+Cached values are shared between callers and must not be modified.
+"""
+
+class MemoryTier:
+    """
+    Per-process LRU of (value, expires, generation) entries.
+
+    Args:
+        size (int): Entries kept before the least recently used is dropped.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteTier:
+    """
+    Entries and namespace generations in a SQLite file shared by the workers on one host.
+
+    Args:
+        path (str): The path to the SQLite file, created on first use.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, namespace TEXT NOT NULL, '
+            'value BLOB NOT NULL, expires REAL NOT NULL, generation INTEGER NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_namespace ON cache_entries (namespace)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_generations (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+        # A new file restarts the generations at 0, so values derived from them also carry the file's random epoch
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_epoch (id INTEGER PRIMARY KEY CHECK (id = 1), epoch TEXT NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO cache_epoch (id, epoch) VALUES (1, ?)', (secrets.token_hex(4),))
+        self.epoch = conn.execute('SELECT epoch FROM cache_epoch').fetchone()[0]
+
+    def _connect(self):
+        # One connection per thread, reopened in forked workers since SQLite handles must not cross a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def generations(self):
+        return dict(self._connect().execute('SELECT namespace, generation FROM cache_generations'))
+
+    def bump(self, namespace):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO cache_generations (namespace, generation) VALUES (?, 1) '
+                'ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1', (namespace,)
+            )
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+            generation = conn.execute('SELECT generation FROM cache_generations WHERE namespace = ?', (namespace,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return generation
+
+    def get(self, key):
+        row = self._connect().execute('SELECT value, expires, generation FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0]), row[1], row[2]
+
+    def set(self, key, namespace, value, expires, generation):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO cache_entries (key, namespace, value, expires, generation) VALUES (?, ?, ?, ?, ?)',
+            (key, namespace, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, generation)
+        )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def purge(self, now):
+        return self._connect().execute('DELETE FROM cache_entries WHERE expires < ?', (now,)).rowcount
+
+    def size(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+class Cache:
+    """
+    Namespaced two-tier cache with TTLs, cross-worker invalidation and hit counters.
+
+    Settings come from app.config: CACHE_LOCAL_SIZE, CACHE_SHARED_PATH (no shared tier when empty),
+    CACHE_DEFAULT_TTL and CACHE_TTLS, a dictionary of namespace to seconds.
+    """
+    def __init__(self, app=None, db=None):
+        self.local = MemoryTier(1024)
+        self.shared = None
+        self.default_ttl = 300
+        self.ttls = {}
+        self._generations = {}  # used when there is no shared tier
+        self._epoch = secrets.token_hex(4)  # likewise
+        self._models = {}  # mapped class: namespaces invalidated when its rows change
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        self.local = MemoryTier(app.config['CACHE_LOCAL_SIZE'])
+        path = app.config.get('CACHE_SHARED_PATH')
+        self.shared = SQLiteTier(path) if path else None
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        self.ttls = dict(app.config.get('CACHE_TTLS', {}))
+        if db is not None:
+            event.listen(db.session, 'after_flush', self._collect_flushed)
+            event.listen(db.session, 'do_orm_execute', self._collect_executed)
+            event.listen(db.session, 'after_commit', self._invalidate_committed)
+            event.listen(db.session, 'after_rollback', self._discard_pending)
+
+    def _count(self, namespace, outcome):
+        with self._stats_lock:
+            counters = self.stats.setdefault(namespace, {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0})
+            counters[outcome] += 1
+
+    @property
+    def epoch(self):
+        """
+        A random value fixed when the generations were created, which changes whenever they restart from 0.
+        """
+        return self.shared.epoch if self.shared is not None else self._epoch
+
+    def generation(self, namespace):
+        """
+        Returns the current generation of a namespace, bumped by each invalidation.
+        """
+        # Read from the shared file once per request, so a request sees one consistent state
+        if self.shared is None:
+            return self._generations.get(namespace, 0)
+        if has_request_context():
+            if 'cache_generations' not in g:
+                g.cache_generations = self.shared.generations()
+            return g.cache_generations.get(namespace, 0)
+        return self.shared.generations().get(namespace, 0)
+
+    def get(self, namespace, key, default=None):
+        """
+        Returns a cached value, or default when it is missing, expired or invalidated.
+        """
+        full_key = f'{namespace}:{key}'
+        now = time.time()
+        generation = self.generation(namespace)
+        entry = self.local.get(full_key)
+        if entry is not None and entry[1] > now and entry[2] == generation:
+            self._count(namespace, 'local_hits')
+            return entry[0]
+        if self.shared is not None:
+            entry = self.shared.get(full_key)
+            if entry is not None and entry[1] > now and entry[2] == generation:
+                self.local.set(full_key, entry)
+                self._count(namespace, 'shared_hits')
+                return entry[0]
+        self._count(namespace, 'misses')
+        return default
+
+    def set(self, namespace, key, value, ttl=None):
+        """
+        Stores a value in both tiers for ttl seconds, or the namespace's TTL from CACHE_TTLS.
+        """
+        full_key = f'{namespace}:{key}'
+        expires = time.time() + (ttl if ttl is not None else self.ttls.get(namespace, self.default_ttl))
+        generation = self.generation(namespace)
+        self.local.set(full_key, (value, expires, generation))
+        if self.shared is not None:
+            self.shared.set(full_key, namespace, value, expires, generation)
+        self._count(namespace, 'sets')
+
+    def get_or_set(self, namespace, key, compute, ttl=None):
+        """
+        Returns the cached value, computing and storing it when missing. None results are not cached.
+        """
+        missing = object()
+        value = self.get(namespace, key, missing)
+        if value is missing:
+            value = compute()
+            if value is not None:
+                self.set(namespace, key, value, ttl)
+        return value
+
+    def delete(self, namespace, key):
+        """
+        Removes one key from this worker and the shared tier. Other workers' copies expire with their TTL,
+        use invalidate() when they must go at once.
+        """
+        full_key = f'{namespace}:{key}'
+        self.local.delete(full_key)
+        if self.shared is not None:
+            self.shared.delete(full_key)
+
+    def invalidate(self, *namespaces):
+        """
+        Drops every entry of the namespaces, in all workers.
+        """
+        for namespace in namespaces:
+            if self.shared is not None:
+                generation = self.shared.bump(namespace)
+                if has_request_context() and 'cache_generations' in g:
+                    g.cache_generations[namespace] = generation
+            else:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self.local.clear(f'{namespace}:')
+            self._count(namespace, 'invalidations')
+
+    def cached(self, namespace, ttl=None, key=None):
+        """
+        Decorator caching a function's result by its arguments.
+
+        Args:
+            namespace (str): The namespace of the entries.
+            ttl (int, optional): Seconds to keep results, the namespace's TTL by default.
+            key (callable, optional): Builds the key from the arguments, their repr by default.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                entry_key = key(*args, **kwargs) if key else repr((args, sorted(kwargs.items())))
+                return self.get_or_set(namespace, entry_key, lambda: function(*args, **kwargs), ttl)
+            wrapper.invalidate = lambda: self.invalidate(namespace)
+            return wrapper
+        return decorator
+
+    def invalidate_on(self, model, *namespaces):
+        """
+        Invalidates the namespaces whenever a transaction that changed rows of the model commits.
+        """
+        self._models.setdefault(model, set()).update(namespaces)
+
+    def invalidate_models(self, *models):
+        """
+        Invalidates the namespaces tied to the models, or to every model when none is given, after writes
+        made outside the session, such as restores, replica refreshes and SQL run by hand.
+        """
+        namespaces = set()
+        for model, model_namespaces in self._models.items():
+            if not models or model in models:
+                namespaces.update(model_namespaces)
+        self.invalidate(*sorted(namespaces))
+
+    def _pending(self, session, classes):
+        namespaces = set()
+        for model, model_namespaces in self._models.items():
+            if any(issubclass(cls, model) for cls in classes):
+                namespaces.update(model_namespaces)
+        if namespaces:
+            session.info.setdefault('cache_invalidate', set()).update(namespaces)
+
+    def _collect_flushed(self, session, flush_context):
+        self._pending(session, {type(instance) for instance in (*session.new, *session.dirty, *session.deleted)})
+
+    def _collect_executed(self, orm_execute_state):
+        # Bulk insert, update and delete statements change rows without a flush
+        if orm_execute_state.is_select or not orm_execute_state.bind_mapper:
+            return
+        self._pending(orm_execute_state.session, {orm_execute_state.bind_mapper.class_})
+
+    def _invalidate_committed(self, session):
+        namespaces = session.info.pop('cache_invalidate', None)
+        if namespaces:
+            try:
+                self.invalidate(*sorted(namespaces))
+            except sqlite3.Error:
+                logging.exception("Cache invalidation of %s failed", ', '.join(sorted(namespaces)))
+
+    def _discard_pending(self, session):
+        session.info.pop('cache_invalidate', None)
+
+    def purge(self):
+        """
+        Removes expired entries from the shared tier.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        return self.shared.purge(time.time()) if self.shared is not None else 0
+
+    def read(self):
+        """
+        Returns the counters of this process by namespace, with hit rates and tier sizes.
+        """
+        with self._stats_lock:
+            stats = {namespace: dict(counters) for namespace, counters in self.stats.items()}
+        for counters in stats.values():
+            lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+            counters['hit_rate'] = round((counters['local_hits'] + counters['shared_hits']) / lookups, 3) if lookups else 0.0
+        return {
+            'local_entries': len(self.local),
+            'shared_entries': self.shared.size() if self.shared is not None else None,
+            'namespaces': stats,
+        }
+
+cache = Cache()
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli  # optional, about 15-20% smaller than gzip on JSON and HTML
+except ImportError:
+    brotli = None
+
+"""
+Response compression, negotiated from Accept-Encoding.
+
+Text responses (JSON, HTML, CSS, JavaScript) larger than COMPRESS_MIN_SIZE are sent with brotli when the
+client accepts it and the brotli package is installed, else gzip. Images and files under
+COMPRESS_SKIP_PATHS (/uploads) are already compressed and are passed through. Streamed responses are
+compressed chunk by chunk, flushing each one so the client receives data as it is produced. HTML bodies
+rendered from templates are mostly identical between requests, so their compressed form is kept by the
+hash of the body and reused.
+"""
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+CACHED = ('text/html', 'text/css', 'application/javascript')  # bodies worth keeping the compressed form of
+
+def gzip_compress(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 writes the gzip header and trailer
+    return compressor.compress(data) + compressor.flush()
+
+def gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        yield data + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def brotli_compress(data, quality):
+    return brotli.compress(data, quality=quality)
+
+def brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk.encode() if isinstance(chunk, str) else chunk)
+        yield data + compressor.flush()
+    yield compressor.finish()
+
+class CompressedBodies:
+    """
+    LRU of compressed bodies keyed by encoding and the hash of the uncompressed body.
+
+    Args:
+        limit (int): Total bytes of compressed bodies kept.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+
+    def get_or_compress(self, encoding, data, compress):
+        key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+        body = compress(data)
+        if len(body) <= self.limit:
+            with self._lock:
+                if key not in self._bodies:
+                    self._bodies[key] = body
+                    self.size += len(body)
+                while self.size > self.limit:
+                    self.size -= len(self._bodies.popitem(last=False)[1])
+        return body
+
+def init_compression(app):
+    """
+    Registers the after_request hook that compresses responses, when app.config['COMPRESS_ENABLED'] is set.
+
+    Register it before the other after_request hooks, since Flask runs them in reverse order and the
+    response must be final before it is compressed.
+
+    Args:
+        app (Flask): The application.
+    """
+    if not app.config['COMPRESS_ENABLED']:
+        return
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    skip_paths = tuple(app.config['COMPRESS_SKIP_PATHS'])
+    levels = {'gzip': app.config['COMPRESS_GZIP_LEVEL'], 'br': app.config['COMPRESS_BROTLI_QUALITY']}
+    compressors = {'gzip': (gzip_compress, gzip_stream)}
+    if brotli is not None:
+        compressors = {'br': (brotli_compress, brotli_stream), **compressors}  # preferred when the client rates both equally
+    bodies = CompressedBodies(app.config['COMPRESS_CACHE_BYTES'])
+    app.extensions['compression'] = bodies
+
+    @app.after_request
+    def compress_response(response):
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or request.path.startswith(skip_paths) or not (response.mimetype or '').startswith(COMPRESSIBLE)
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(list(compressors))
+        if encoding is None:
+            return response
+        compress, stream = compressors[encoding]
+        level = levels[encoding]
+
+        if response.is_streamed:
+            original = response.response
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.response = stream(response.iter_encoded(), level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            if response.mimetype in CACHED:
+                body = bodies.get_or_compress(encoding, data, lambda data: compress(data, level))
+            else:
+                body = compress(data, level)
+            response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different byte sequence, so a strong validator no longer matches it
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
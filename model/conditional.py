@@ -0,0 +1,64 @@
+import functools
+from flask import current_app, make_response, request
+from model.cache import cache
+
+"""
+Conditional GET for endpoints that list rarely changing tables.
+
+Every tracked table has a generation counter, a cache namespace bumped when a transaction that wrote
+to the table commits, in any worker. The weak ETag of a response is built from the generations of the
+tables it reads, so it changes exactly when one of them does. A request whose If-None-Match carries the
+current ETag gets 304 before the handler runs, without a query of its own; on authenticated endpoints
+token_required goes outside the decorator, so the token is checked first. The counters live in the
+shared cache file, so several workers need CACHE_SHARED_PATH set, which is the default. The ETag also
+carries the random epoch of that file, so a new or deleted file, whose counters restart at 0, cannot
+reissue an ETag handed out for other data. Writes made outside the session do not bump the counters:
+the restore, snapshot and replica commands call cache.invalidate_models(), and after SQL run by hand
+`flask custom clear_cache table:<name>` does the same for one table.
+"""
+
+def table_namespace(model):
+    return f'table:{model.__tablename__}'
+
+def track(*models):
+    """
+    Bumps the generation of each model's table when a transaction that changed its rows commits.
+    """
+    for model in models:
+        cache.invalidate_on(model, table_namespace(model))
+
+def table_etag(*models):
+    """
+    Returns the ETag value for a response built from the tables of these models.
+    """
+    tables = '.'.join(model.__tablename__ for model in models)
+    generations = '.'.join(str(cache.generation(table_namespace(model))) for model in models)
+    return f"{current_app.config['ETAG_VERSION']}-{cache.epoch}-{tables}-{generations}"
+
+def conditional(*models, private=False):
+    """
+    Decorator answering GET with 304 while the tables of these models are unchanged.
+
+    Args:
+        *models: The models whose tables the response is built from.
+        private (bool): Whether the response depends on the user, so shared caches must not keep it.
+    """
+    track(*models)
+    cache_control = 'private, no-cache' if private else 'public, no-cache'
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Taken before the handler queries, so a write committed meanwhile changes the next ETag
+            etag = table_etag(*models)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(function(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
@@ -1,8 +1,16 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
+import logging
+import threading
+import time
 
 class GradePredictionModel:
+    _instance = None
+    _lock = threading.Lock()
+
     def __init__(self):
+        # Imported here so the app boots without pandas and scikit-learn, see get_instance
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+
         # Load dataset
         data = pd.read_csv("datasets/ap_predict_data.csv")
 
@@ -27,6 +35,16 @@ class GradePredictionModel:
         self.model = LinearRegression()
         self.model.fit(X, y)
 
+    @classmethod
+    def get_instance(cls):
+        # Trained by the first prediction request, or at boot when PRELOAD_MODELS is set
+        with cls._lock:
+            if cls._instance is None:
+                start = time.perf_counter()
+                cls._instance = cls()
+                logging.info("Grade prediction model trained in %.2f s", time.perf_counter() - start)
+        return cls._instance
+
     def predict(self, user_input):
         # Validate input length
         if len(user_input) != len(self.features):
@@ -19,7 +19,8 @@ class Group(db.Model):
         id (db.Column): The primary key, an integer representing the unique identifier for the group.
         _name (db.Column): A string representing the name of the group.
         _section_id (db.Column): An integer representing the section to which the group belongs.
-        moderators (relationship): A collection of users who are the moderators of the group.
+        moderators (relationship): A collection of users who are the moderators of the group, loaded on first access.
+            Use selectinload(Group.moderators) to batch load them for a list of groups when the User objects are needed.
     """
     __tablename__ = 'groups'
 
@@ -28,7 +29,7 @@ class Group(db.Model):
     _section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
 
     channels = db.relationship('Channel', backref='group', lazy=True)
-    moderators = db.relationship('User', secondary=group_moderators, lazy='subquery',
+    moderators = db.relationship('User', secondary=group_moderators, lazy='select',
                                  backref=db.backref('moderated_groups', lazy=True))
     
     def __init__(self, name, section_id, moderators=None):
@@ -81,19 +82,63 @@ class Group(db.Model):
             db.session.rollback()
             raise e
     
-    def read(self):
+    def read(self, moderator_ids=None):
         """
         The read method retrieves the object data from the object's attributes and returns it as a dictionary.
         
+        Args:
+            moderator_ids (list, optional): The ids of the group's moderators, when already known.
+                Defaults to the loaded moderators, or else to a query of the group_moderators table.
+        
         Returns:
             dict: A dictionary containing the group data.
         """
+        if moderator_ids is None:
+            if 'moderators' in self.__dict__:
+                moderator_ids = [moderator.id for moderator in self.moderators]
+            else:
+                moderator_ids = Group.moderator_ids([self.id]).get(self.id, [])
         return {
             'id': self.id,
             'name': self._name,
             'section_id': self._section_id,
-            'moderators': [moderator.id for moderator in self.moderators]
+            'moderators': moderator_ids
         }
+
+    @staticmethod
+    def moderator_ids(group_ids):
+        """
+        Reads the moderator ids of groups from the group_moderators table alone, without loading users.
+        
+        Args:
+            group_ids (list): The ids of the groups.
+        
+        Returns:
+            dict: A list of moderator ids by group id, for the groups that have moderators.
+        """
+        rows = db.session.execute(
+            db.select(group_moderators.c.group_id, group_moderators.c.user_id)
+            .where(group_moderators.c.group_id.in_(group_ids))
+            .order_by(group_moderators.c.group_id, group_moderators.c.user_id)
+        )
+        moderators = {}
+        for group_id, user_id in rows:
+            moderators.setdefault(group_id, []).append(user_id)
+        return moderators
+
+    @staticmethod
+    def read_many(groups):
+        """
+        Reads a list of groups with a single moderator id query for all of them.
+        
+        Args:
+            groups (list): Group objects.
+        
+        Returns:
+            list: A dictionary of group data per group, as returned by read().
+        """
+        moderators = Group.moderator_ids([group.id for group in groups]) if groups else {}
+        return [group.read(moderators.get(group.id, [])) for group in groups]
         
     def update(self, inputs):
         """
@@ -0,0 +1,98 @@
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime, time
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # optional, several times faster than json for large responses
+except ImportError:
+    orjson = None
+
+"""
+JSON encoding of responses and decoding of request bodies.
+
+Uses orjson when it is installed and JSON_ENCODER is not 'stdlib', else the standard json module, with
+equivalent output either way: keys sorted as Flask does by default, and dates and datetimes as ISO 8601
+strings, so models can return them without calling isoformat. Anything orjson refuses, such as integers
+beyond 64 bits, is encoded by the standard module instead. The bytes differ: orjson writes non-ASCII
+characters as UTF-8 where the standard module escapes them as \\uXXXX, and orjson writes NaN and infinity
+as null, valid JSON, where the standard module writes the bare NaN and Infinity tokens that strict JSON
+parsers reject.
+"""
+
+def default(o):
+    """
+    Encodes the types json does not handle natively.
+    """
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson when available.
+    """
+    default = staticmethod(default)
+
+    def __init__(self, app, encoder='auto'):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and encoder != 'stdlib'
+        if encoder == 'orjson' and orjson is None:
+            raise RuntimeError("JSON_ENCODER=orjson requires the orjson package")
+
+    @property
+    def encoder(self):
+        return 'orjson' if self.use_orjson else 'json'
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return self._orjson_dumps(obj).decode('utf-8')
+            except (orjson.JSONEncodeError, TypeError):
+                pass  # encoded below, or raises the error json would
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # NaN, integers beyond 64 bits and invalid documents are left to json
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        if self.use_orjson:
+            try:
+                body = self._orjson_dumps(obj, indent) + b'\n'
+                return self._app.response_class(body, mimetype=self.mimetype)
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+        return super().response(obj)
+
+def init_json(app):
+    """
+    Installs the provider for jsonify and request.get_json, and the same date handling for flask_restful.
+
+    Args:
+        app (Flask): The application, with app.config['JSON_ENCODER'] set to auto, orjson or stdlib.
+    """
+    app.json = FastJSONProvider(app, app.config['JSON_ENCODER'])
+    # Resources that return dictionaries are encoded by flask_restful with json.dumps(data, **RESTFUL_JSON)
+    app.config.setdefault('RESTFUL_JSON', {})['default'] = default
@@ -43,8 +43,8 @@ class Palomar(db.Model):
             "platform": self.platform,
             "post_type": self.post_type,
             "content": self.content,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "created_at": self.created_at,  # encoded as ISO 8601 by the app's JSON provider
+            "updated_at": self.updated_at
         }
 
     def delete(self):
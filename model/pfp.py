@@ -1,7 +1,196 @@
 import base64
+import hashlib
+import io
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
 from werkzeug.utils import secure_filename
 from __init__ import app
+from model.blobstore import blob_digest, blob_path, blob_put, is_blob_key
+
+# Background pool that builds the thumbnail and WebP variants of uploaded images, Pillow releases the GIL while resizing
+_variant_pool = ThreadPoolExecutor(max_workers=app.config['IMAGE_VARIANT_WORKERS'], thread_name_prefix='image-variants')
+
+# Content hashes of uploaded files keyed by path, reused while the file's mtime and size are unchanged
+_etag_cache = {}
+_etag_lock = threading.Lock()
+
+def pfp_file_path(user_uid, filename):
+    """
+    Returns the path of a user's uploaded file.
+
+    Files saved through image_save are referenced by blob key and live in the shared blob store, files uploaded
+    before the blob store live in the user's own directory.
+
+    Parameters:
+    - user_uid (str): The unique identifier for the user.
+    - filename (str): The blob key or legacy filename of the uploaded file.
+
+    Returns:
+    - str: The path of the file inside BLOB_FOLDER or UPLOAD_FOLDER.
+    """
+    if is_blob_key(filename):
+        return blob_path(filename)
+    return os.path.join(app.config['UPLOAD_FOLDER'], user_uid, filename)
+
+def pfp_file_etag(img_path):
+    """
+    Returns the SHA-256 content hash of a file, used as its ETag and as the version in image URLs.
+
+    The file is only read again when its modification time or size changes.
+
+    Parameters:
+    - img_path (str): The path of the file.
+
+    Returns:
+    - str: The hex digest of the file content, or None if the file cannot be read.
+    """
+    name = os.path.basename(img_path)
+    if is_blob_key(name):
+        return blob_digest(name)  # blob names already carry their content hash
+    try:
+        stat = os.stat(img_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with _etag_lock:
+            cached = _etag_cache.get(img_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(img_path, 'rb') as img_file:
+            for chunk in iter(lambda: img_file.read(64 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        with _etag_lock:
+            _etag_cache[img_path] = (key, etag)
+        return etag
+    except OSError as e:
+        print(f'An error occurred while hashing the profile picture: {str(e)}')
+        return None
+
+def image_variant_name(filename, size=None, webp=False):
+    """
+    Returns the filename of a variant of an uploaded image.
+
+    Parameters:
+    - filename (str): The filename of the original image, for example 'toby.png'.
+    - size (int, optional): The bounding box of the thumbnail in pixels, None for the full size image.
+    - webp (bool): True for the WebP encoding, False for the original format.
+
+    Returns:
+    - str: The variant filename, for example 'toby_128.webp'.
+    """
+    stem, ext = os.path.splitext(filename)
+    if size:
+        stem = f'{stem}_{size}'
+    return stem + ('.webp' if webp else ext)
+
+def _atomic_save(image, file_path, **params):
+    # Write next to the target and rename so readers never see a partly written file
+    tmp_path = f'{file_path}.tmp{threading.get_ident()}'
+    image.save(tmp_path, **params)
+    os.replace(tmp_path, file_path)
+
+def _flatten(image, fmt):
+    # JPEG has no alpha channel and palette images resize poorly
+    if fmt == 'JPEG':
+        return image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        return image.convert('RGBA')
+    return image
+
+def image_build_variants(file_path):
+    """
+    Builds the downscaled thumbnails and WebP variants of a saved image.
+
+    For each size in IMAGE_VARIANT_SIZES a thumbnail is written in the original format and as WebP, plus a
+    full size WebP copy. Sizes larger than the image are skipped. Runs on the background variant pool.
+
+    Parameters:
+    - file_path (str): The path of the original image.
+    """
+    try:
+        directory, filename = os.path.split(file_path)
+        with Image.open(file_path) as original:
+            fmt = original.format
+            original.load()
+        _atomic_save(_flatten(original, 'WEBP'), os.path.join(directory, image_variant_name(filename, webp=True)),
+                     format='WEBP', quality=app.config['IMAGE_WEBP_QUALITY'])
+        for size in app.config['IMAGE_VARIANT_SIZES']:
+            if max(original.size) <= size:
+                continue
+            thumbnail = _flatten(original, fmt).copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            _atomic_save(thumbnail, os.path.join(directory, image_variant_name(filename, size)), format=fmt)
+            _atomic_save(_flatten(thumbnail, 'WEBP'), os.path.join(directory, image_variant_name(filename, size, webp=True)),
+                         format='WEBP', quality=app.config['IMAGE_WEBP_QUALITY'])
+    except Exception as e:
+        print(f'An error occurred while building image variants for {file_path}: {str(e)}')
+
+def image_save(image_data, filename):
+    """
+    Validates an uploaded image, strips its metadata and stores it in the blob store, then queues its variants.
+
+    The bytes must decode as an image in one of the UPLOAD_EXTENSIONS formats. The image is re-encoded, which
+    drops EXIF, GPS and other metadata after applying the EXIF orientation, in the format matching the filename
+    extension. An image whose re-encoded content is already stored is not written again. Thumbnails and WebP
+    variants of new blobs are built on a background pool so the upload returns without waiting for them.
+
+    Parameters:
+    - image_data (bytes): The uploaded image.
+    - filename (str): The uploaded filename, its extension selects the stored format.
+
+    Returns:
+    - str: The blob key of the stored image, to be saved on the record.
+
+    Raises:
+    - ValueError: The data is not a valid image or the filename has an unsupported extension.
+    """
+    formats = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.gif': 'GIF'}
+    fmt = formats.get(os.path.splitext(filename)[1].lower())
+    if not fmt:
+        raise ValueError(f'Unsupported image type: {filename}')
+    try:
+        with Image.open(io.BytesIO(image_data)) as probe:
+            probe.verify()  # checks the file structure without decoding the pixels
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.load()
+            image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ValueError(f'Invalid image: {str(e)}')
+
+    # Saving a fresh image object keeps only the pixels, metadata blocks are not carried over
+    buffer = io.BytesIO()
+    _flatten(image, fmt).save(buffer, format=fmt)
+    key, created = blob_put(buffer.getvalue(), '.jpg' if fmt == 'JPEG' else f'.{fmt.lower()}')
+    if created:
+        _variant_pool.submit(image_build_variants, blob_path(key))
+    return key
+
+def image_variant_path(user_uid, filename, size=None, webp=False):
+    """
+    Returns the path of the smallest built variant that covers the requested size.
+
+    Falls back to the original image when no variant is large enough or the variants are still being built.
+
+    Parameters:
+    - user_uid (str): The unique identifier for the user.
+    - filename (str): The filename of the original image.
+    - size (int, optional): The displayed size in pixels, None for the full size image.
+    - webp (bool): True if the client accepts WebP.
+
+    Returns:
+    - str: The path of the file to serve.
+    """
+    original = pfp_file_path(user_uid, filename)
+    directory = os.path.dirname(original)  # variants are stored next to the original
+    candidates = [s for s in sorted(app.config['IMAGE_VARIANT_SIZES']) if size and s >= size] + [None]
+    for candidate in candidates:
+        for use_webp in ((True, False) if webp else (False,)):
+            path = os.path.join(directory, image_variant_name(filename, candidate, use_webp))
+            if path != original and os.path.isfile(path):
+                return path
+    return original
 
 def pfp_base64_decode(user_id, user_pfp):
     """
@@ -17,7 +206,7 @@ def pfp_base64_decode(user_id, user_pfp):
     Returns:
     - str: The base64 encoded image if the user has a profile picture; otherwise, None.
     """
-    img_path = os.path.join(app.config['UPLOAD_FOLDER'], user_id, user_pfp)
+    img_path = pfp_file_path(user_id, user_pfp)
     try:
         with open(img_path, 'rb') as img_file:
             base64_encoded = base64.b64encode(img_file.read()).decode('utf-8')
@@ -30,27 +219,21 @@ def pfp_base64_upload(base64_image, user_uid):
     """
     Uploads a base64 encoded image as a profile picture for a user.
 
-    This function decodes a base64 encoded image and saves it to a secure location on the server.
-    It organizes images by storing each user's image in a separate directory within the UPLOAD_FOLDER.
-    This approach helps to avoid filename conflicts and ensures better organization of files.
+    This function decodes a base64 encoded image and saves it in the content-addressed blob store.
+    Identical images uploaded by different users are stored once, and the returned key does not depend
+    on the user, so renaming a user does not touch the file.
 
     Parameters:
     - base64_image (str): The base64 encoded image to be uploaded.
     - user_uid (str): The unique identifier for the user.
 
     Returns:
-    - str: The filename of the saved image if the upload is successful; otherwise, None.
+    - str: The blob key of the saved image if the upload is successful; otherwise, None.
     """
     try:
         image_data = base64.b64decode(base64_image)
         filename = secure_filename(f'{user_uid}.png')
-        user_dir = os.path.join(app.config['UPLOAD_FOLDER'], user_uid)
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        file_path = os.path.join(user_dir, filename)
-        with open(file_path, 'wb') as img_file:
-            img_file.write(image_data)
-        return filename 
+        return image_save(image_data, filename)
     except Exception as e:
         print (f'An error occurred while updating the profile picture: {str(e)}')
         return None
@@ -59,8 +242,8 @@ def pfp_file_delete(user_uid, filename):
     """
     Deletes the profile picture file from the server.
 
-    This function removes a file from the server's filesystem. It is typically used to delete profile pictures
-    when a user updates their image or removes it entirely.
+    This function removes a file and its variants from the server's filesystem. It is typically used to delete
+    profile pictures when a user updates their image or removes it entirely.
 
     Parameters:
     - user_uid (str): The unique identifier for the user.
@@ -69,10 +252,19 @@ def pfp_file_delete(user_uid, filename):
     Returns:
     - bool: True if the file was deleted successfully; otherwise, False.
     """
+    if is_blob_key(filename):
+        # Blobs may be shared with other users, unreferenced blobs are removed by garbage collection
+        return True
     try:
         img_path = os.path.join(app.config['UPLOAD_FOLDER'], user_uid, filename)
         if os.path.exists(img_path):
             os.remove(img_path)
+        # Remove the thumbnails and WebP variants built from the image
+        for size in [None] + list(app.config['IMAGE_VARIANT_SIZES']):
+            for webp in (False, True):
+                variant_path = os.path.join(app.config['UPLOAD_FOLDER'], user_uid, image_variant_name(filename, size, webp))
+                if variant_path != img_path and os.path.exists(variant_path):
+                    os.remove(variant_path)
         # Success is when the file does not exist after calling this function
         return True 
     except Exception as e:
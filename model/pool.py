@@ -0,0 +1,90 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+"""
+Connection pool with checkout-wait and in-use gauges.
+
+Used as the poolclass of the database engine, configured by the DB_POOL_* settings in __init__.py.
+It behaves as QueuePool and keeps counters of how long requests wait for a connection, how many gave up
+after pool_timeout and how many connections were found dead and replaced, read by /api/metrics/pool.
+"""
+
+SLOW_CHECKOUT = 0.001  # seconds, a checkout slower than this waited for a connection or opened a new one
+
+class PoolStats:
+    """
+    Thread-safe counters of one pool.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.wait_max = 0.0
+        self.waited = 0  # checkouts that took longer than SLOW_CHECKOUT
+        self.timeouts = 0
+        self.invalidated = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds > SLOW_CHECKOUT:
+                self.waited += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_invalidated(self):
+        with self._lock:
+            self.invalidated += 1
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool that records the time spent waiting for each checkout.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        # Connections found dead by pre-ping, or closed after an error, are invalidated and replaced
+        event.listen(self, 'invalidate', lambda dbapi_connection, record, exception: self.stats.record_invalidated())
+        event.listen(self, 'soft_invalidate', lambda dbapi_connection, record, exception: self.stats.record_invalidated())
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def read(self):
+        """
+        Returns the pool gauges and counters.
+
+        Returns:
+            dict: size, in-use, idle and overflow connections, and the checkout wait counters.
+        """
+        stats = self.stats
+        with stats._lock:
+            checkouts = stats.checkouts
+            return {
+                'size': self.size(),
+                'in_use': self.checkedout(),
+                'idle': self.checkedin(),
+                'overflow': max(0, self.overflow()),
+                'max_overflow': self._max_overflow,
+                'timeout_seconds': self._timeout,
+                'checkouts': checkouts,
+                'waited': stats.waited,
+                'wait_avg_ms': round(stats.wait_seconds / checkouts * 1000, 3) if checkouts else 0.0,
+                'wait_max_ms': round(stats.wait_max * 1000, 3),
+                'timeouts': stats.timeouts,
+                'invalidated': stats.invalidated,
+            }
@@ -0,0 +1,66 @@
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+"""
+Read-replica routing for the read-heavy GET endpoints.
+
+When DB_REPLICA_URI is set, GET requests to a path in REPLICA_READ_PATHS read through the 'replica' bind
+and everything else uses the primary database. A request that writes switches to the primary for the
+rest of the request, and its response sets a cookie that keeps the same client on the primary for
+REPLICA_READ_YOUR_WRITES seconds, so users see their own changes even while the replica lags behind.
+The cookie is read by whichever worker serves the next request.
+"""
+
+PIN_COOKIE = 'db_primary_until'
+
+class RoutingSession(Session):
+    """
+    Session that reads from the replica bind when the current request was routed to it.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_request_context() and g.get('db_read_replica') and not self.info.get('db_wrote')
+                and not self._flushing and not isinstance(clause, UpdateBase)):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _after_flush(session, flush_context):
+    # Writes go to the primary, and the reads after them in this request must see them; the session ends with the request
+    session.info['db_wrote'] = True
+    if has_request_context():
+        g.db_wrote = True
+
+def init_replica_routing(app, db):
+    """
+    Registers the request hooks that route reads, when a replica is configured.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database created with RoutingSession, or a subclass, as its session class.
+    """
+    event.listen(db.session, 'after_flush', _after_flush)
+    if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @app.before_request
+    def route_reads():
+        if request.method not in ('GET', 'HEAD'):
+            return
+        if not any(request.path.startswith(path) for path in app.config['REPLICA_READ_PATHS']):
+            return
+        try:
+            pinned = float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        g.db_read_replica = not pinned
+
+    @app.after_request
+    def pin_writers(response):
+        window = app.config['REPLICA_READ_YOUR_WRITES']
+        if g.get('db_wrote') and window > 0:
+            response.set_cookie(PIN_COOKIE, str(time.time() + window), max_age=window, secure=True,
+                                httponly=True, path='/', samesite='None')
+        response.headers['X-DB-Route'] = 'replica' if g.get('db_read_replica') and not g.get('db_wrote') else 'primary'
+        return response
@@ -0,0 +1,253 @@
+import logging
+import re
+from sqlalchemy import bindparam, event, inspect, select, text
+from __init__ import db
+from model.channel import Channel
+from model.post import Post
+from model.user import User
+
+"""
+Full-text search over posts.
+
+The post_search table holds the searchable text of every post: its title, its comment and the string
+values of its JSON content, with its channel id for scoping. On SQLite it is an FTS5 virtual table and
+results are ranked by bm25, with a title match weighing more than a comment match and a comment match
+more than a content match. The channel is stored as a token, c<id>, so scoping a search to channels
+intersects posting lists in the index rather than reading every match. Scoring reads the statistics
+of each row it ranks, so a query matching a large share of the posts ranks only its newest
+SEARCH_RANK_WINDOW matches; narrower queries are ranked in full. The total counts every match, while
+ranked counts those that can be paged; older matches past the window are never returned. On MySQL it
+is an InnoDB table with a FULLTEXT index and an indexed channel_id, ranked by MATCH ... AGAINST
+relevance, which weighs the three columns alike.
+
+The index is written in the same flush as the post, so it commits or rolls back with it. Bulk statements
+on posts bypass the ORM and are not indexed; run `flask custom rebuild_search` after them. The table is
+created with the schema by db.create_all(), as in `flask custom generate_data` and the db_init scripts,
+and filled from the existing posts when it is new; db.drop_all() drops it with the posts. Until it exists,
+posts are written without indexing and searches raise SearchIndexMissing.
+"""
+
+SEARCH_TABLE = 'post_search'
+MAX_TERMS = 8  # words of a query used, the rest are ignored
+INDEXED = ('_title', '_comment', '_content', '_channel_id')  # Post attributes whose change rewrites the index row
+
+logger = logging.getLogger(__name__)
+_index_exists = False  # set once this process has seen the table, which then stays until drop_all()
+
+class SearchIndexMissing(Exception):
+    """
+    Raised by a search when the post_search table has not been created.
+    """
+
+def search_text(content):
+    """
+    Returns the string values of a post's JSON content, nested values included, joined by spaces.
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        content = list(content.values())
+    if isinstance(content, list):
+        return ' '.join(filter(None, (search_text(value) for value in content)))
+    return ''
+
+def _dialect(connection=None):
+    return (connection or db.engine).dialect.name
+
+def has_search_index(connection):
+    """
+    Returns whether the post_search table exists, remembering a True answer for the rest of the process.
+    """
+    global _index_exists
+    if not _index_exists:
+        _index_exists = inspect(connection).has_table(SEARCH_TABLE)
+    return _index_exists
+
+def create_search_index(connection):
+    """
+    Creates the post_search table when it does not exist.
+
+    Returns:
+        bool: True when the table was created.
+    """
+    if has_search_index(connection):
+        return False
+    if _dialect(connection) == 'mysql':
+        connection.execute(text(
+            f'CREATE TABLE {SEARCH_TABLE} (post_id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, '
+            'title VARCHAR(255) NOT NULL, comment VARCHAR(255) NOT NULL, content TEXT NOT NULL, '
+            'KEY ix_post_search_channel (channel_id), FULLTEXT KEY ft_post_search (title, comment, content)) '
+            'ENGINE=InnoDB DEFAULT CHARSET=utf8mb4'
+        ))
+    else:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(channel_id, title, comment, content, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        ))
+    return True
+
+def _delete_rows(connection, ids):
+    if ids:
+        key = 'post_id' if _dialect(connection) == 'mysql' else 'rowid'
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE {key} IN :ids').bindparams(bindparam('ids', expanding=True)),
+                           {'ids': list(ids)})
+
+def _write_rows(connection, rows):
+    # Rows are (id, channel_id, title, comment, content) and replace the index rows of the same posts
+    if not rows:
+        return
+    mysql = _dialect(connection) == 'mysql'
+    _delete_rows(connection, [row[0] for row in rows])
+    connection.execute(
+        text(f"INSERT INTO {SEARCH_TABLE} ({'post_id' if mysql else 'rowid'}, channel_id, title, comment, content) "
+             'VALUES (:id, :channel_id, :title, :comment, :content)'),
+        [{'id': id, 'channel_id': channel_id if mysql else f'c{channel_id}', 'title': title or '', 'comment': comment or '',
+          'content': search_text(content)} for id, channel_id, title, comment, content in rows]
+    )
+
+@event.listens_for(db.session, 'after_flush')
+def _index_posts(session, flush_context):
+    # Runs inside the flush transaction, so the index changes exactly when the posts do
+    rows, deleted = [], []
+    for post in session.new:
+        if isinstance(post, Post):
+            rows.append((post.id, post._channel_id, post._title, post._comment, post._content))
+    for post in session.dirty:
+        if isinstance(post, Post) and any(inspect(post).attrs[name].history.has_changes() for name in INDEXED):
+            rows.append((post.id, post._channel_id, post._title, post._comment, post._content))
+    for post in session.deleted:
+        if isinstance(post, Post):
+            deleted.append(inspect(post).identity[0])
+    if rows or deleted:
+        connection = session.connection()
+        if not has_search_index(connection):
+            return  # indexed when the table is created
+        _delete_rows(connection, deleted)
+        _write_rows(connection, rows)
+
+def rebuild_search_index(batch_size=1000):
+    """
+    Drops the post_search table and indexes every post again, batch by batch in primary key order.
+
+    Args:
+        batch_size (int): Posts read and indexed per statement.
+
+    Returns:
+        int: The number of posts indexed.
+    """
+    global _index_exists
+    with db.engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE IF EXISTS {SEARCH_TABLE}'))
+        _index_exists = False
+        create_search_index(connection)
+        return _fill_search_index(connection, batch_size)
+
+def _fill_search_index(connection, batch_size=1000):
+    count = 0
+    columns = (Post.id, Post._channel_id, Post._title, Post._comment, Post._content)
+    last_id = 0
+    while True:
+        rows = connection.execute(select(*columns).where(Post.id > last_id).order_by(Post.id).limit(batch_size)).all()
+        if not rows:
+            break
+        _write_rows(connection, rows)
+        count += len(rows)
+        last_id = rows[-1][0]
+    if _dialect(connection) == 'sqlite':
+        # Merges the segments written batch by batch into one, which the first queries would otherwise pay for
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+    return count
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_schema(metadata, connection, **kw):
+    # create_all() runs in the db_init scripts and the init functions of generate_data, not on every start
+    if create_search_index(connection) and inspect(connection).has_table(Post.__tablename__):
+        logger.warning('Indexed %d posts for search', _fill_search_index(connection))
+
+@event.listens_for(db.metadata, 'after_drop')
+def _drop_with_schema(metadata, connection, **kw):
+    global _index_exists
+    connection.execute(text(f'DROP TABLE IF EXISTS {SEARCH_TABLE}'))
+    _index_exists = False
+
+def match_expression(query, dialect, channel_ids=None):
+    """
+    Turns a user's query into a match expression that requires every word, the last one as a prefix.
+
+    Only the words of the query are kept, so its punctuation cannot form operators or a syntax error.
+    On SQLite the words are matched in the text columns only, and the channels, if any, are part of the
+    expression; on MySQL they are filtered in SQL.
+
+    Returns:
+        str: The expression, or None when the query has no words.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    if dialect == 'mysql':
+        return ' '.join(f'+{term}' for term in terms) + '*'
+    match = '{title comment content} : (' + ' '.join(f'"{term}"' for term in terms) + '*)'
+    if channel_ids:
+        match = '(' + ' OR '.join(f'channel_id : c{int(id)}' for id in channel_ids) + ') AND ' + match
+    return match
+
+def search_posts(query, channel_ids=None, page=1, per_page=20, window=5000):
+    """
+    Searches the titles, comments and content of posts, best matches first.
+
+    Args:
+        query (str): The words to search for.
+        channel_ids (list, optional): Only posts in these channels are returned. Defaults to all channels.
+        page (int): The page of results, from 1.
+        per_page (int): Results per page.
+        window (int): On SQLite, only the newest this many matches are ranked and paged; the total counts all.
+
+    Returns:
+        dict: The total number of matches, the number of them ranked and paged, which is at most window on
+        SQLite, and the posts of the page, in the format of Post.read().
+
+    Raises:
+        SearchIndexMissing: When the post_search table has not been created.
+    """
+    if not has_search_index(db.session.connection()):
+        raise SearchIndexMissing(f'{SEARCH_TABLE} does not exist, run `flask custom rebuild_search`')
+    dialect = _dialect()
+    match = match_expression(query, dialect, channel_ids)
+    if match is None:
+        return {'total': 0, 'ranked': 0, 'results': []}
+    params = {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page}
+    if dialect == 'mysql':
+        where = 'MATCH (title, comment, content) AGAINST (:match IN BOOLEAN MODE)'
+        if channel_ids:
+            where += ' AND channel_id IN :channel_ids'
+            params['channel_ids'] = list(channel_ids)
+        page_sql = (f'SELECT post_id FROM {SEARCH_TABLE} WHERE {where} '
+                    'ORDER BY MATCH (title, comment, content) AGAINST (:match IN BOOLEAN MODE) DESC, post_id DESC '
+                    'LIMIT :limit OFFSET :offset')
+    else:
+        where = f'{SEARCH_TABLE} MATCH :match'
+        # bm25 reads the statistics of every row it scores, so only the newest window of matches is scored; the index
+        # returns matches in rowid order without scoring them. The weights are those of channel_id, title, comment, content
+        params['window'] = window
+        page_sql = (f'SELECT {SEARCH_TABLE}.rowid FROM (SELECT rowid FROM {SEARCH_TABLE} WHERE {where} ORDER BY rowid DESC '
+                    f'LIMIT :window) AS recent JOIN {SEARCH_TABLE} ON {SEARCH_TABLE}.rowid = recent.rowid WHERE {where} '
+                    f'ORDER BY bm25({SEARCH_TABLE}, 0.0, 10.0, 5.0, 1.0), {SEARCH_TABLE}.rowid DESC LIMIT :limit OFFSET :offset')
+
+    def statement(sql):
+        statement = text(sql)
+        return statement.bindparams(bindparam('channel_ids', expanding=True)) if 'channel_ids' in params else statement
+
+    total = db.session.execute(statement(f'SELECT count(*) FROM {SEARCH_TABLE} WHERE {where}'), params).scalar()
+    ranked = total if dialect == 'mysql' else min(total, window)
+    ids = db.session.execute(statement(page_sql), params).scalars().all()
+    if not ids:
+        return {'total': total, 'ranked': ranked, 'results': []}
+    rows = db.session.execute(
+        select(Post.id, Post._title, Post._comment, Post._content, User._name, Channel._name)
+        .outerjoin(User, User.id == Post._user_id)
+        .outerjoin(Channel, Channel.id == Post._channel_id)
+        .where(Post.id.in_(ids))
+    ).all()
+    posts = {row[0]: {'id': row[0], 'title': row[1], 'comment': row[2], 'content': row[3], 'user_name': row[4],
+                      'channel_name': row[5]} for row in rows}
+    return {'total': total, 'ranked': ranked, 'results': [posts[id] for id in ids if id in posts]}
@@ -0,0 +1,243 @@
+import glob
+import hashlib
+import os
+import shutil
+import sqlite3
+import struct
+from __init__ import app
+
+"""
+Online snapshots of the SQLite database.
+
+Snapshots use the SQLite online backup API, which copies the database a few pages per step and releases
+its lock between steps, so gunicorn workers keep writing while a snapshot is taken and the copy is still
+consistent. Copying the .db file instead can catch a write half done.
+
+A full snapshot is a plain SQLite file with a page index beside it, <snapshot>.pages, holding a hash of
+every page. An incremental snapshot stores only the pages whose hash changed since the previous snapshot,
+in <snapshot>.<n>.delta. Applying the deltas to the full snapshot in order rebuilds the latest one.
+"""
+
+DELTA_MAGIC = b'SQLDELTA1'
+DELTA_HEADER = struct.Struct('>II')  # page size, page count
+DELTA_PAGE = struct.Struct('>I')  # page number, followed by the page
+PAGE_DIGEST_SIZE = 16
+
+def sqlite_path(uri):
+    """
+    Returns the file path of a sqlite:/// URI, relative paths being inside the instance folder as Flask-SQLAlchemy resolves them.
+    """
+    path = uri[len('sqlite:///'):]
+    return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+def _online_copy(db_path, target_path, pages, sleep, progress=None):
+    # Copies the database in steps of a few pages, sleeping between steps so writers are not held up
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        # The copy takes the live database's WAL mode; switch it back so the snapshot is one self-contained file
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target.close()
+        source.close()
+
+def _page_digests(path, page_size):
+    digests = []
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            digests.append(hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest())
+    return digests
+
+def _page_size(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        conn.close()
+
+def _write_index(snapshot_path, page_size, digests):
+    tmp_path = f'{snapshot_path}.pages.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(DELTA_HEADER.pack(page_size, len(digests)))
+        f.write(b''.join(digests))
+    os.replace(tmp_path, f'{snapshot_path}.pages')
+
+def _read_index(snapshot_path):
+    with open(f'{snapshot_path}.pages', 'rb') as f:
+        page_size, page_count = DELTA_HEADER.unpack(f.read(DELTA_HEADER.size))
+        data = f.read()
+    return page_size, [data[i:i + PAGE_DIGEST_SIZE] for i in range(0, page_count * PAGE_DIGEST_SIZE, PAGE_DIGEST_SIZE)]
+
+def snapshot_deltas(snapshot_path):
+    """
+    Returns the delta files of a snapshot in the order they are applied.
+    """
+    deltas = glob.glob(f'{glob.escape(snapshot_path)}.*.delta')
+    return sorted(deltas, key=lambda path: int(path[len(snapshot_path) + 1:-len('.delta')]))
+
+def snapshot_full(db_path, snapshot_path, pages=256, sleep=0.005, progress=None):
+    """
+    Takes a full online snapshot and starts a new chain of incremental snapshots from it.
+
+    Args:
+        db_path (str): The live database file.
+        snapshot_path (str): The snapshot file, replaced once the copy is complete.
+        pages (int): The number of pages copied per step.
+        sleep (float): The seconds to wait between steps.
+        progress (callable, optional): Called by sqlite3 with status, remaining and total pages after each step.
+
+    Returns:
+        dict: The snapshot kind, the pages copied and the bytes written.
+    """
+    tmp_path = f'{snapshot_path}.tmp'
+    _online_copy(db_path, tmp_path, pages, sleep, progress)
+    return _install_full(tmp_path, snapshot_path)
+
+def _install_full(copy_path, snapshot_path):
+    # Makes a completed copy the full snapshot, dropping the deltas of the previous chain
+    os.replace(copy_path, snapshot_path)
+    for delta in snapshot_deltas(snapshot_path):
+        os.remove(delta)
+    page_size = _page_size(snapshot_path)
+    digests = _page_digests(snapshot_path, page_size)
+    _write_index(snapshot_path, page_size, digests)
+    return {'kind': 'full', 'pages': len(digests), 'bytes': os.path.getsize(snapshot_path)}
+
+def snapshot_incremental(db_path, snapshot_path, pages=256, sleep=0.005, progress=None):
+    """
+    Stores the pages changed since the last snapshot as the next delta of the snapshot.
+
+    The database is first copied online next to the snapshot so the pages compared are consistent, then
+    only the pages whose hash differs from the page index are kept. Falls back to a full snapshot when
+    there is none yet or the page size changed.
+
+    Args:
+        db_path (str): The live database file.
+        snapshot_path (str): The full snapshot the deltas apply to.
+        pages (int): The number of pages copied per step.
+        sleep (float): The seconds to wait between steps.
+        progress (callable, optional): Called by sqlite3 with status, remaining and total pages after each step.
+
+    Returns:
+        dict: The snapshot kind, the pages compared, the pages changed and the bytes written.
+    """
+    if not (os.path.exists(snapshot_path) and os.path.exists(f'{snapshot_path}.pages')):
+        return snapshot_full(db_path, snapshot_path, pages, sleep, progress)
+    tmp_path = f'{snapshot_path}.tmp'
+    _online_copy(db_path, tmp_path, pages, sleep, progress)
+    try:
+        page_size, previous = _read_index(snapshot_path)
+        if _page_size(tmp_path) != page_size:
+            return _install_full(tmp_path, snapshot_path)
+
+        deltas = snapshot_deltas(snapshot_path)
+        number = int(deltas[-1][len(snapshot_path) + 1:-len('.delta')]) + 1 if deltas else 1
+        delta_path = f'{snapshot_path}.{number}.delta'
+        digests, changed = [], 0
+        with open(tmp_path, 'rb') as source, open(f'{delta_path}.tmp', 'wb') as delta:
+            delta.write(DELTA_MAGIC)
+            delta.write(DELTA_HEADER.pack(page_size, os.path.getsize(tmp_path) // page_size))
+            page_no = 0
+            while True:
+                page = source.read(page_size)
+                if not page:
+                    break
+                digest = hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest()
+                digests.append(digest)
+                if page_no >= len(previous) or previous[page_no] != digest:
+                    delta.write(DELTA_PAGE.pack(page_no))
+                    delta.write(page)
+                    changed += 1
+                page_no += 1
+        if not changed and len(digests) == len(previous):
+            os.remove(f'{delta_path}.tmp')  # nothing changed, the chain is already current
+            return {'kind': 'incremental', 'pages': len(digests), 'changed': 0, 'bytes': 0}
+        os.replace(f'{delta_path}.tmp', delta_path)
+        _write_index(snapshot_path, page_size, digests)
+        return {'kind': 'incremental', 'pages': len(digests), 'changed': changed, 'bytes': os.path.getsize(delta_path)}
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def snapshot_restore(snapshot_path, target_path):
+    """
+    Writes the latest state of a snapshot, the full snapshot with its deltas applied in order, to a file.
+
+    Args:
+        snapshot_path (str): The full snapshot.
+        target_path (str): The database file to write, replaced once complete.
+    """
+    tmp_path = f'{target_path}.tmp'
+    shutil.copyfile(snapshot_path, tmp_path)
+    with open(tmp_path, 'r+b') as target:
+        for delta_path in snapshot_deltas(snapshot_path):
+            with open(delta_path, 'rb') as delta:
+                if delta.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+                    raise ValueError(f"{delta_path} is not a snapshot delta")
+                page_size, page_count = DELTA_HEADER.unpack(delta.read(DELTA_HEADER.size))
+                while True:
+                    header = delta.read(DELTA_PAGE.size)
+                    if not header:
+                        break
+                    (page_no,) = DELTA_PAGE.unpack(header)
+                    target.seek(page_no * page_size)
+                    target.write(delta.read(page_size))
+            target.truncate(page_count * page_size)
+    os.replace(tmp_path, target_path)
+
+def snapshot_verify(snapshot_path):
+    """
+    Opens the latest state of a snapshot read-only and runs PRAGMA integrity_check on it.
+
+    Returns:
+        list: The integrity_check messages, ['ok'] for a sound snapshot.
+    """
+    path = snapshot_path
+    if snapshot_deltas(snapshot_path):
+        path = f'{snapshot_path}.verify'
+        snapshot_restore(snapshot_path, path)
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            return [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+    finally:
+        if path != snapshot_path:
+            os.remove(path)
+
+def copy_database(db_path, target_path, pages=256, sleep=0.005):
+    """
+    Replaces a database file with an online copy of the live database, such as the local stand-in for the read replica.
+    """
+    tmp_path = f'{target_path}.tmp'
+    _online_copy(db_path, tmp_path, pages, sleep)
+    os.replace(tmp_path, target_path)
+
+def backup_database(db_uri, backup_uri, incremental=False):
+    """
+    Snapshots the SQLite database to the backup URI and verifies the snapshot.
+
+    Args:
+        db_uri (str): The SQLALCHEMY_DATABASE_URI.
+        backup_uri (str): The SQLALCHEMY_BACKUP_URI, None for the MySQL production database.
+        incremental (bool): Store only the pages changed since the last snapshot.
+    """
+    if not backup_uri:
+        print("Backup not supported for production database.")
+        return
+    db_path = sqlite_path(db_uri)
+    backup_path = sqlite_path(backup_uri)
+    take = snapshot_incremental if incremental else snapshot_full
+    result = take(db_path, backup_path, pages=app.config['SQLITE_BACKUP_PAGES'], sleep=app.config['SQLITE_BACKUP_SLEEP'])
+    check = snapshot_verify(backup_path)
+    if check != ['ok']:
+        raise RuntimeError(f"Snapshot {backup_path} failed integrity_check: {'; '.join(check[:5])}")
+    if result['kind'] == 'incremental':
+        print(f"Database backed up to {backup_path}: {result['changed']} of {result['pages']} pages changed, {result['bytes']} bytes, integrity ok")
+    else:
+        print(f"Database backed up to {backup_path}: {result['pages']} pages, {result['bytes']} bytes, integrity ok")
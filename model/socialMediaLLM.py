@@ -1,17 +1,18 @@
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import accuracy_score
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-import pandas as pd
-import numpy as np
-import seaborn as sns
+import logging
+import threading
+import time
+
+# pandas and scikit-learn take about a second to import, so they are imported when the model is first
+# built instead of when the app boots; unused numpy and seaborn (which pulls in matplotlib) were dropped
 
 class SocialMediaModel:
     # Beginning of LLM for Palomar Social Media
     _instance = None
+    _lock = threading.Lock()
     
     def __init__(self):
+        import pandas as pd
+        from sklearn.preprocessing import OneHotEncoder
         self.model = None
         self.dt = None
         self.features = ['is_retweet']
@@ -28,6 +29,7 @@ class SocialMediaModel:
         self.encoder = OneHotEncoder(handle_unknown='ignore')
         
     def _clean(self):
+        import pandas as pd
         self.properties_df.drop(['CustomFolderName', 'CustomFileName', 
                                  'FileExtensionHandleMethod', 'status_id', 
                                  'owner_screen_name', 'owner_display_name', 
@@ -54,6 +56,8 @@ class SocialMediaModel:
         # self.properties_df.dropna(inplace=True)
 
     def _train(self):
+        from sklearn.linear_model import LinearRegression
+        from sklearn.tree import DecisionTreeRegressor
         X = self.properties_df[self.features]
         y = self.properties_df[self.target]
         
@@ -67,14 +71,20 @@ class SocialMediaModel:
     # NO idea what this does, just praying
     @classmethod
     def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = cls()
-            cls._instance._clean()
-            cls._instance._train()
+        # Built by the first request that needs it, once even when requests arrive together
+        with cls._lock:
+            if cls._instance is None:
+                start = time.perf_counter()
+                instance = cls()
+                instance._clean()
+                instance._train()
+                cls._instance = instance
+                logging.info("Social media model loaded in %.2f s", time.perf_counter() - start)
         # return the instance, to be used for prediction
         return cls._instance
     
     def predict(self, tweet):
+        import pandas as pd
         # Takes the tweet in as a dict
         tweet_df = pd.DataFrame(tweet, index=[0])
         if 'type' not in tweet_df.columns:
@@ -0,0 +1,63 @@
+import logging
+from flask import g, has_request_context, jsonify
+from model.routing import RoutingSession
+
+"""
+Request-scoped unit of work.
+
+Model methods call db.session.commit() after each change, so one request that creates a user and then
+updates it commits several times, and each commit is a round trip and a durable write of its own. With
+UNIT_OF_WORK enabled, a commit inside a request only flushes: the changes are sent and constraint errors
+are raised where they were before, and ids are assigned, but the transaction stays open. The request
+commits once after the handler returns, or rolls back if the handler failed with a server error. A
+model that rolls back after an error rolls back the whole request, so a request is saved entirely or
+not at all. Commits outside a request, in CLI commands and scripts, are unchanged.
+"""
+
+class UnitOfWorkSession(RoutingSession):
+    """
+    Session whose commit is deferred to the end of the request while a unit of work is open.
+    """
+    def commit(self):
+        if has_request_context() and g.get('unit_of_work'):
+            self.flush()
+            g.unit_of_work_commits = g.get('unit_of_work_commits', 0) + 1
+            return
+        super().commit()
+
+def init_unit_of_work(app, db):
+    """
+    Registers the request hooks that open and close the unit of work when app.config['UNIT_OF_WORK'] is set.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database created with UnitOfWorkSession as its session class.
+    """
+    @app.before_request
+    def begin_unit_of_work():
+        g.unit_of_work = app.config['UNIT_OF_WORK']
+
+    @app.after_request
+    def commit_unit_of_work(response):
+        if not g.pop('unit_of_work', False):
+            return response
+        # Only requests where a model asked to commit are committed, as before
+        if not g.get('unit_of_work_commits'):
+            return response
+        if response.status_code >= 500:
+            db.session.rollback()
+            return response
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.exception("Unit of work commit failed")
+            response = jsonify({'message': 'Could not save changes', 'error': str(e)})
+            response.status_code = 500
+        return response
+
+    @app.teardown_request
+    def end_unit_of_work(exception):
+        # The handler raised before the response was built, nothing of the request is kept
+        if g.pop('unit_of_work', False):
+            db.session.rollback()
@@ -3,11 +3,15 @@ from flask import current_app
 from flask_login import UserMixin
 from datetime import date
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
 from werkzeug.security import generate_password_hash, check_password_hash
+import base64
 import os
 import json
 
 from __init__ import app, db
+from model.pfp import image_save
 
 """ Helper Functions """
 
@@ -54,17 +58,34 @@ class User(db.Model, UserMixin):
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
-    _name = db.Column(db.String(255), unique=False, nullable=False)
+    _name = db.Column(db.String(255), unique=False, nullable=False, index=True)
     _uid = db.Column(db.String(255), unique=True, nullable=False)
     _email = db.Column(db.String(255), unique=False, nullable=False)
     _password = db.Column(db.String(255), unique=False, nullable=False)
-    _role = db.Column(db.String(20), default="User", nullable=False)
+    _role = db.Column(db.String(20), default="User", nullable=False, index=True)
     _pfp = db.Column(db.String(255), unique=False, nullable=True)
     _car = db.Column(db.String(255), unique=False, nullable=True)
     _grade_data = db.Column(db.JSON, unique=False, nullable=True)
     _ap_exam = db.Column(db.JSON, unique=False, nullable=True)
    
     posts = db.relationship('Post', backref='author', lazy=True)
+
+    # Fields that read() can return, mapped to the column that backs each one
+    READ_FIELDS = {
+        'id': 'id',
+        'uid': '_uid',
+        'name': '_name',
+        'email': '_email',
+        'role': '_role',
+        'pfp': '_pfp',
+        'car': '_car',
+        'grade_data': '_grade_data',
+        'ap_exam': '_ap_exam',
+    }
+    # Fields the user tables can sort by, each backed by an index that also carries the id tiebreaker
+    SORT_FIELDS = ('id', 'uid', 'name', 'role')
+    # Fields the user tables search by prefix
+    SEARCH_FIELDS = ('uid', 'name')
                                  
     
     def __init__(self, name, uid, password="", role="User", pfp='', car='', email='?', grade_data=None, ap_exam=None):
@@ -375,13 +396,140 @@ class User(db.Model, UserMixin):
             db.session.rollback()
             return None
 
-    def read(self):
+    @staticmethod
+    def parse_fields(value):
+        """
+        Parses a comma separated field list, such as the ?fields=uid,name,role query parameter.
+        
+        Args:
+            value (str): The comma separated field names, or None for all fields.
+        
+        Returns:
+            list: The requested field names, always including 'id', or None for all fields.
+        
+        Raises:
+            ValueError: A requested field is not one of User.READ_FIELDS.
+        """
+        if not value:
+            return None
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in User.READ_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(unknown)}")
+        return ['id'] + [field for field in fields if field != 'id']
+
+    @staticmethod
+    def query_fields(fields=None):
+        """
+        Returns a User query that loads only the columns needed to read the given fields.
+        
+        The remaining columns, such as the grade_data and ap_exam JSON blobs, are deferred and never fetched
+        as long as only the requested fields are read.
+        
+        Args:
+            fields (list, optional): The field names to load. Defaults to all fields.
+        
+        Returns:
+            Query: The User query with load_only options applied.
+        """
+        if not fields:
+            return User.query
+        return User.query.options(load_only(*[getattr(User, User.READ_FIELDS[field]) for field in fields]))
+
+    @staticmethod
+    def query_search(search=None, fields=None):
+        """
+        Returns a User query filtered to users whose uid or name starts with the search text.
+        
+        The prefix match is written as a range comparison so the uid and name indexes are used
+        instead of a full table scan.
+        
+        Args:
+            search (str, optional): The prefix to match. Defaults to no filter.
+            fields (list, optional): The field names to load, see query_fields.
+        
+        Returns:
+            Query: The filtered User query.
+        """
+        query = User.query_fields(fields)
+        if search:
+            upper = search + '\uffff'
+            query = query.filter(or_(*[
+                and_(column >= search, column < upper)
+                for column in (getattr(User, User.READ_FIELDS[field]) for field in User.SEARCH_FIELDS)
+            ]))
+        return query
+
+    @staticmethod
+    def query_page(query, sort='id', order='asc', after=None, offset=0, limit=50):
+        """
+        Returns one page of a User query using keyset or offset pagination.
+        
+        Keyset pagination continues after the cursor returned by the previous page and costs the same
+        for every page. Offset pagination is kept for clients that jump to a page number.
+        
+        Args:
+            query (Query): The User query to page, as returned by query_search.
+            sort (str): The field to sort by, one of User.SORT_FIELDS. Defaults to 'id'.
+            order (str): 'asc' or 'desc'. Defaults to 'asc'.
+            after (str, optional): The cursor of the previous page for keyset pagination.
+            offset (int): The number of rows to skip when no cursor is given. Defaults to 0.
+            limit (int): The page size. Defaults to 50.
+        
+        Returns:
+            tuple: The list of users on the page and the cursor of the next page, or None on the last page.
+        
+        Raises:
+            ValueError: The sort field, order or cursor is invalid.
+        """
+        if sort not in User.SORT_FIELDS:
+            raise ValueError(f"Cannot sort users by {sort}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Unknown sort order {order}")
+        column = getattr(User, User.READ_FIELDS[sort])
+        descending = order == 'desc'
+
+        if after:
+            try:
+                value, last_id = json.loads(base64.urlsafe_b64decode(after.encode()))
+            except Exception:
+                raise ValueError("Invalid page cursor")
+            if sort == 'id':
+                query = query.filter(User.id < last_id if descending else User.id > last_id)
+            elif descending:
+                query = query.filter(or_(column < value, and_(column == value, User.id < last_id)))
+            else:
+                query = query.filter(or_(column > value, and_(column == value, User.id > last_id)))
+
+        if sort == 'id':
+            ordering = [User.id.desc() if descending else User.id.asc()]
+        else:
+            ordering = [column.desc(), User.id.desc()] if descending else [column.asc(), User.id.asc()]
+        query = query.order_by(*ordering)
+        if offset and not after:
+            query = query.offset(offset)
+
+        # Fetch one extra row to learn whether another page follows
+        users = query.limit(limit + 1).all()
+        if len(users) <= limit:
+            return users, None
+        users = users[:limit]
+        last = users[-1]
+        cursor = base64.urlsafe_b64encode(json.dumps([getattr(last, User.READ_FIELDS[sort]), last.id]).encode()).decode()
+        return users, cursor
+
+    def read(self, fields=None):
         """
         Converts the user object to a dictionary.
         
+        Args:
+            fields (list, optional): The field names to include, as returned by parse_fields. Defaults to all fields.
+        
         Returns:
             dict: A dictionary representation of the user object.
         """
+        if fields:
+            return {field: getattr(self, User.READ_FIELDS[field]) for field in fields}
         data = {
             "id": self.id,
             "uid": self.uid,
@@ -412,6 +560,7 @@ class User(db.Model, UserMixin):
         uid = inputs.get("uid", "")
         password = inputs.get("password", "")
         pfp = inputs.get("pfp", None)
+        car = inputs.get("car", None)
         grade_data = inputs.get("grade_data", None)
         ap_exam = inputs.get("ap_exam", None)
 
@@ -424,6 +573,8 @@ class User(db.Model, UserMixin):
             self.set_password(password)
         if pfp is not None:
             self.pfp = pfp
+        if car is not None:
+            self.car = car
         if grade_data is not None:
             self.grade_data = grade_data
         if ap_exam is not None:
@@ -460,15 +611,13 @@ class User(db.Model, UserMixin):
         Args:
             image_data (bytes): The image data of the profile picture.
             filename (str): The filename of the profile picture.
+        
+        Raises:
+            ValueError: The image data is not a valid image.
         """
         try:
-            user_dir = os.path.join(app.config['UPLOAD_FOLDER'], self.uid)
-            if not os.path.exists(user_dir):
-                os.makedirs(user_dir)
-            file_path = os.path.join(user_dir, filename)
-            with open(file_path, 'wb') as img_file:
-                img_file.write(image_data)
-            self.update({"pfp": filename})
+            key = image_save(image_data, filename)  # validates, strips metadata and stores the image by content hash
+            self.update({"pfp": key})
         except Exception as e:
             raise e
         
@@ -486,15 +635,13 @@ class User(db.Model, UserMixin):
         Args:
             image_data (bytes): The image data of the car picture.
             filename (str): The filename of the car picture.
+        
+        Raises:
+            ValueError: The image data is not a valid image.
         """
         try:
-            user_dir = os.path.join(app.config['UPLOAD_FOLDER'], self.uid)
-            if not os.path.exists(user_dir):
-                os.makedirs(user_dir)
-            file_path = os.path.join(user_dir, filename)
-            with open(file_path, 'wb') as img_file:
-                img_file.write(image_data)
-            self.update({"car": filename})
+            key = image_save(image_data, filename)  # validates, strips metadata and stores the image by content hash
+            self.update({"car": key})
         except Exception as e:
             raise e
         
@@ -507,7 +654,10 @@ class User(db.Model, UserMixin):
         
     def set_uid(self, new_uid=None):
         """
-        Updates the user's directory based on the new UID provided.
+        Updates the user's UID.
+        
+        Pictures in the blob store are keyed by content and do not move. A legacy upload directory named after
+        the old UID is renamed to match.
 
         Args:
             new_uid (str, optional): The new UID to update the user's directory.
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+""" bench_compression.py
+Measures response sizes and the time a slow client waits, with and without compression.
+
+Requests the main pages and list endpoints as the admin user through the test client, once per
+encoding (identity, gzip, and br when the brotli package is installed). It records the server time,
+which includes the compression, and the bytes sent. The client's wait is modeled as server time plus
+one round trip plus the transfer time at --kbps. The defaults match the "Fast 3G" profile of browser
+dev tools: 1.6 Mbit/s down and 150 ms RTT. A second request per page shows the reuse of compressed
+template bodies.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_compression.py
+
+Or run from the root of the project:
+> scripts/bench_compression.py [--kbps 1600] [--rtt-ms 150] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from main import app
+from model.compression import brotli
+
+ENDPOINTS = ['/studytracker', '/login', '/api/users', '/api/posts', '/api/ai/logs', '/api/hotel']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--kbps', type=float, default=1600, help='client download bandwidth in kilobits per second')
+    parser.add_argument('--rtt-ms', type=float, default=150, help='round trip time')
+    parser.add_argument('--repeat', type=int, default=20, help='requests timed per endpoint and encoding')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    client.set_cookie(app.config['JWT_TOKEN_NAME'],
+                      jwt.encode({'_uid': app.config['ADMIN_USER']}, app.config['SECRET_KEY'], algorithm='HS256'))
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+    print(f"client at {args.kbps:g} kbit/s, {args.rtt_ms:g} ms RTT")
+    print(f"{'endpoint':<16}{'encoding':>10}{'bytes':>10}{'ratio':>8}{'server (ms)':>13}{'client wait (ms)':>18}")
+    for endpoint in ENDPOINTS:
+        plain = None
+        for encoding in encodings:
+            headers = {'Accept-Encoding': encoding}
+            response = client.get(endpoint, headers=headers)
+            if response.status_code != 200:
+                print(f"{endpoint:<16}  returned {response.status_code}, skipped")
+                break
+            size = len(response.get_data())
+            plain = plain or size
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                client.get(endpoint, headers=headers).get_data()
+            server = (time.perf_counter() - start) / args.repeat * 1000
+            wait = server + args.rtt_ms + size * 8 / args.kbps
+            sent = response.headers.get('Content-Encoding', 'identity')
+            print(f"{endpoint:<16}{sent:>10}{size:>10}{plain / size:>7.1f}x{server:>13.2f}{wait:>18.0f}")
+    bodies = app.extensions.get('compression')
+    if bodies:
+        print(f"compressed template bodies reused {bodies.hits} times, compressed {bodies.misses} times")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+""" bench_group_queries.py
+Counts the SQL statements behind the group list and filter endpoints.
+
+Calls each endpoint as the admin user through the test client and reports the statements one request
+sends and its latency. The endpoints are GET /api/groups, POST /api/groups/filter for every section,
+and POST /api/group/filter and /api/channels/filter for every group. The channel filter resolves its
+group by name but never reads its moderators, so any moderator query there is wasted. --groups seeds
+that many extra groups, each with one moderator, into the first section, and deletes them at the end.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_group_queries.py
+
+Or run from the root of the project:
+> scripts/bench_group_queries.py [--repeat 20] [--groups 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from sqlalchemy import event
+from main import app, db
+from model.group import Group, group_moderators
+from model.section import Section
+from model.user import User
+
+statements = [0]
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements[0] += 1
+
+def measure(client, method, url, body, repeat):
+    statements[0] = 0
+    response = client.open(url, method=method, json=body)
+    if response.status_code != 200:
+        raise RuntimeError(f"{method} {url} returned {response.status_code}")
+    count = statements[0]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.open(url, method=method, json=body)
+    return count, (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=20, help='requests timed per endpoint')
+    parser.add_argument('--groups', type=int, default=200, help='extra groups seeded for the run')
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+        section = Section.query.order_by(Section.id).first()
+        moderator = User.query.filter_by(_uid=app.config['ADMIN_USER']).first()
+        for i in range(args.groups):
+            db.session.add(Group(f'bench_group_{i}', section.id, [moderator]))
+        db.session.commit()
+        sections = [section._name for section in Section.query.all()]
+        groups = [group._name for group in Group.query.all()]
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    client = app.test_client()
+    client.set_cookie(app.config['JWT_TOKEN_NAME'],
+                      jwt.encode({'_uid': app.config['ADMIN_USER']}, app.config['SECRET_KEY'], algorithm='HS256'))
+    try:
+        run(client, sections, groups, args.repeat)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+        with app.app_context():
+            seeded = db.select(Group.id).where(Group._name.like('bench_group_%'))
+            db.session.execute(group_moderators.delete().where(group_moderators.c.group_id.in_(seeded)))
+            Group.query.filter(Group._name.like('bench_group_%')).delete(synchronize_session=False)
+            db.session.commit()
+
+def run(client, sections, groups, repeat):
+    cases = [('GET /api/groups', [('GET', '/api/groups', None)]),
+             ('POST /api/groups/filter', [('POST', '/api/groups/filter', {'section_name': name}) for name in sections]),
+             ('POST /api/group/filter', [('POST', '/api/group/filter', {'group_name': name}) for name in groups]),
+             ('POST /api/channels/filter', [('POST', '/api/channels/filter', {'group_name': name}) for name in groups])]
+    print(f"{len(sections)} sections, {len(groups)} groups, mean per request")
+    print(f"{'endpoint':<28}{'calls':>7}{'statements':>12}{'latency (ms)':>14}")
+    for name, calls in cases:
+        results = [measure(client, method, url, body, repeat) for method, url, body in calls]
+        count = sum(result[0] for result in results) / len(results)
+        latency = sum(result[1] for result in results) / len(results)
+        print(f"{name:<28}{len(calls):>7}{count:>12.1f}{latency:>14.2f}")
+
+if __name__ == "__main__":
+    main()
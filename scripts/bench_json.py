@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+""" bench_json.py
+Times the JSON encoding of the main list endpoints with the standard json module and with orjson.
+
+Each endpoint is called once as the admin user to get its real payload. The payload is then encoded
+repeatedly by the app's JSON provider in both modes, the way jsonify encodes it. --scale repeats
+the list items to approximate a production-sized table. The end-to-end latency of each endpoint is
+also measured in both modes through the test client, which includes the queries.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_json.py
+
+Or run from the root of the project:
+> scripts/bench_json.py [--scale 100] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from main import app
+from model.json_provider import FastJSONProvider, orjson
+
+ENDPOINTS = ['/api/posts', '/api/users', '/api/ai/logs', '/api/palomar', '/api/hotel']
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scale', type=int, default=100, help='times each list payload is repeated')
+    parser.add_argument('--repeat', type=int, default=50, help='encodings timed per payload')
+    args = parser.parse_args()
+    if orjson is None:
+        sys.exit("orjson is not installed, there is nothing to compare")
+
+    providers = {'json': FastJSONProvider(app, 'stdlib'), 'orjson': FastJSONProvider(app, 'orjson')}
+    client = app.test_client()
+    client.set_cookie(app.config['JWT_TOKEN_NAME'],
+                      jwt.encode({'_uid': app.config['ADMIN_USER']}, app.config['SECRET_KEY'], algorithm='HS256'))
+
+    print(f"payloads x{args.scale}, encode time per response")
+    print(f"{'endpoint':<16}{'items':>8}{'KB':>9}{'json (ms)':>11}{'orjson (ms)':>13}{'speedup':>9}"
+          f"{'request json (ms)':>19}{'request orjson (ms)':>21}")
+    for endpoint in ENDPOINTS:
+        response = client.get(endpoint)
+        if response.status_code != 200:
+            print(f"{endpoint:<16}  returned {response.status_code}, skipped")
+            continue
+        payload = json.loads(response.get_data())
+        if isinstance(payload, list):
+            payload = payload * args.scale
+        with app.app_context():
+            size = len(providers['json'].response(payload).get_data())
+            encode = {name: timed(lambda: provider.response(payload), args.repeat) for name, provider in providers.items()}
+        latency = {}
+        for name, provider in providers.items():
+            app.json = provider
+            latency[name] = timed(lambda: client.get(endpoint), max(5, args.repeat // 5))
+        items = len(payload) if isinstance(payload, list) else 1
+        print(f"{endpoint:<16}{items:>8}{size / 1024:>9.1f}{encode['json']:>11.2f}{encode['orjson']:>13.2f}"
+              f"{encode['json'] / encode['orjson']:>8.1f}x{latency['json']:>19.2f}{latency['orjson']:>21.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+""" bench_post_search.py
+Measures post search latency against a LIKE scan, at 100k posts by default.
+
+Seeds --posts posts with random text drawn from a Zipf-distributed vocabulary, spread over the existing
+channels, with bulk inserts that bypass the index, then times rebuild_search_index() over them. It then
+runs --queries searches of each kind (a common word, a rare word, a prefix, two words, and a common word
+scoped to one channel) through search_posts(), and the same searches as the case-insensitive LIKE scan
+over title and comment that a search without an index would need, and reports median and 95th
+percentile latency. Last it creates posts one at a time through the ORM to time the indexing done on
+commit. The seeded posts are deleted and the index rebuilt at the end.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_post_search.py
+
+Or run from the root of the project:
+> scripts/bench_post_search.py [--posts 100000] [--queries 50]
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func, insert, or_
+from main import app, db
+from model.channel import Channel
+from model.post import Post
+from model.search import rebuild_search_index, search_posts
+from model.user import User
+
+MARKER = '[bench]'
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qu', 'do', 'fi', 'gu', 'he', 'jo']
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+def sentence(words, cum_weights, length, rng):
+    return ' '.join(rng.choices(words, cum_weights=cum_weights, k=length))
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95) - 1] * 1000
+
+def like_search(terms, channel_ids, per_page=20):
+    # What a search without the index costs: every word must appear in the title or the comment
+    query = Post.query
+    for term in terms:
+        query = query.filter(or_(Post._title.ilike(f'%{term}%'), Post._comment.ilike(f'%{term}%')))
+    if channel_ids:
+        query = query.filter(Post._channel_id.in_(channel_ids))
+    return query.count(), query.order_by(Post.id.desc()).limit(per_page).all()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--posts', type=int, default=100000, help='posts seeded for the run')
+    parser.add_argument('--queries', type=int, default=50, help='searches timed per kind')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='distinct words in the seeded text')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    words = vocabulary(args.vocabulary, rng)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))  # cumulative, Zipf
+
+    with app.app_context():
+        channel_ids = [id for id, in db.session.query(Channel.id).all()]
+        user_ids = [id for id, in db.session.query(User.id).limit(50).all()]
+        if not channel_ids or not user_ids:
+            print("Needs at least one channel and one user, run `flask custom generate_data` first.")
+            return
+        start_id = db.session.query(func.max(Post.id)).scalar() or 0
+
+        start = time.perf_counter()
+        for offset in range(0, args.posts, 5000):
+            db.session.execute(insert(Post), [{
+                '_title': f'{MARKER} {sentence(words, weights, rng.randint(4, 8), rng)}',
+                '_comment': sentence(words, weights, rng.randint(10, 30), rng)[:255],
+                '_content': {'type': 'bench', 'body': sentence(words, weights, rng.randint(10, 40), rng)},
+                '_user_id': rng.choice(user_ids),
+                '_channel_id': rng.choice(channel_ids),
+            } for _ in range(min(5000, args.posts - offset))])
+            db.session.commit()
+        print(f"Seeded {args.posts} posts in {time.perf_counter() - start:.1f}s")
+
+        try:
+            start = time.perf_counter()
+            indexed = rebuild_search_index()
+            seconds = time.perf_counter() - start
+            print(f"rebuild_search_index: {indexed} posts in {seconds:.1f}s ({indexed / seconds:.0f} posts/s)")
+
+            kinds = {
+                'common word': lambda: ([rng.choice(words[:20])], None),
+                'rare word': lambda: ([rng.choice(words[-5000:])], None),
+                'prefix': lambda: ([rng.choice(words[:2000])[:4]], None),
+                'two words': lambda: ([rng.choice(words[:200]), rng.choice(words[:2000])], None),
+                'one channel': lambda: ([rng.choice(words[:20])], [rng.choice(channel_ids)]),
+            }
+            print(f"{'query':<14}{'matches':>9}{'FTS p50':>10}{'p95':>8}{'LIKE p50':>10}{'p95':>8}  (ms)")
+            for name, make in kinds.items():
+                searches = [make() for _ in range(args.queries)]
+                fts, like, matches = [], [], []
+                for terms, channels in searches:
+                    start = time.perf_counter()
+                    found = search_posts(' '.join(terms), channels, window=app.config['SEARCH_RANK_WINDOW'])
+                    fts.append(time.perf_counter() - start)
+                    matches.append(found['total'])
+                    db.session.expunge_all()
+                for terms, channels in searches[:max(5, args.queries // 5)]:  # the scan is slow, fewer samples
+                    start = time.perf_counter()
+                    like_search(terms, channels)
+                    like.append(time.perf_counter() - start)
+                    db.session.expunge_all()
+                print(f"{name:<14}{statistics.median(matches):>9.0f}{percentiles(fts)[0]:>10.2f}{percentiles(fts)[1]:>8.2f}"
+                      f"{percentiles(like)[0]:>10.2f}{percentiles(like)[1]:>8.2f}")
+
+            created = []
+            for i in range(200):
+                post = Post(f'{MARKER} created {i} {words[-1]}', sentence(words, weights, 20, rng)[:255],
+                            rng.choice(user_ids), rng.choice(channel_ids), {'type': 'bench'})
+                start = time.perf_counter()
+                post.create()
+                created.append(time.perf_counter() - start)
+            p50, p95 = percentiles(created)
+            found = search_posts(f'{MARKER} created {words[-1]}', per_page=1)['total']
+            print(f"Post.create() with indexing: p50 {p50:.2f} ms, p95 {p95:.2f} ms, {found} of 200 found by search")
+        finally:
+            Post.query.filter(Post.id > start_id, Post._title.like(f'{MARKER}%')).delete(synchronize_session=False)
+            db.session.commit()
+            rebuild_search_index()
+
+if __name__ == "__main__":
+    main()
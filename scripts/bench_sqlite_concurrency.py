@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+""" bench_sqlite_concurrency.py
+Measures SQLite read/write throughput under concurrent worker processes, with and without the SQLITE_PRAGMAS profile.
+
+Builds a throwaway SQLite database with 10k rows, then starts one process per worker, as gunicorn does,
+each running a mix of single row reads and single row update + commit for a few seconds. It is run
+twice: once with SQLite defaults (rollback journal, synchronous=FULL) and once with the connect-event
+hook from __init__.py applying app.config['SQLITE_PRAGMAS'] (WAL, synchronous=NORMAL, ...).
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_sqlite_concurrency.py
+
+Or run from the root of the project:
+> scripts/bench_sqlite_concurrency.py [workers] [seconds] [write_percent]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from __init__ import set_sqlite_pragmas
+
+ROWS = 10000
+
+def seed(path):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, hits INTEGER NOT NULL, payload TEXT NOT NULL)'))
+        conn.execute(text('INSERT INTO items (id, hits, payload) VALUES (:id, 0, :payload)'),
+                     [{'id': i, 'payload': 'x' * 200} for i in range(1, ROWS + 1)])
+    engine.dispose()
+
+def worker(path, tuned, seconds, write_percent, results):
+    if not tuned:
+        event.remove(Engine, 'connect', set_sqlite_pragmas)
+    engine = create_engine(f'sqlite:///{path}')
+    reads = writes = locked = 0
+    write_latencies = []
+    deadline = time.perf_counter() + seconds
+    with engine.connect() as conn:
+        while time.perf_counter() < deadline:
+            row_id = random.randint(1, ROWS)
+            try:
+                if random.randint(1, 100) <= write_percent:
+                    start = time.perf_counter()
+                    conn.execute(text('UPDATE items SET hits = hits + 1 WHERE id = :id'), {'id': row_id})
+                    conn.commit()
+                    write_latencies.append(time.perf_counter() - start)
+                    writes += 1
+                else:
+                    conn.execute(text('SELECT payload FROM items WHERE id = :id'), {'id': row_id}).fetchone()
+                    conn.commit()  # end the read transaction, as a request does
+                    reads += 1
+            except OperationalError:
+                conn.rollback()
+                locked += 1
+    engine.dispose()
+    results.put((reads, writes, locked, write_latencies))
+
+def run(tuned, workers, seconds, write_percent):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(path, tuned, seconds, write_percent, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    reads = sum(total[0] for total in totals)
+    writes = sum(total[1] for total in totals)
+    locked = sum(total[2] for total in totals)
+    latencies = sorted(latency for total in totals for latency in total[3])
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    return reads / seconds, writes / seconds, locked, p99
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    write_percent = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    print(f"{workers} workers, {seconds:g}s, {write_percent}% writes")
+    print(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}{'locked':>10}{'p99 write (ms)':>16}")
+    for name, tuned in (('default', False), ('tuned', True)):
+        reads, writes, locked, p99 = run(tuned, workers, seconds, write_percent)
+        print(f"{name:<10}{reads:>12.0f}{writes:>12.0f}{locked:>10}{p99:>16.1f}")
+
+if __name__ == "__main__":
+    main()
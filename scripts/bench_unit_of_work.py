@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+""" bench_unit_of_work.py
+Counts the SQL round trips and commits per request on the user create and update paths, with and without UNIT_OF_WORK.
+
+Drives the app through its test client against the configured database:
+- POST /api/user creates a user (User.create commits, then update commits again)
+- PUT /api/user as that user renames it and changes the uid (set_uid commits, then update commits)
+Every statement and every COMMIT the engine sends is counted. Each commit is a durable write, an fsync
+under SQLite synchronous=FULL or MySQL's default innodb_flush_log_at_trx_commit=1. The bench users are
+deleted at the end.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_unit_of_work.py
+
+Or run from the root of the project:
+> scripts/bench_unit_of_work.py [iterations]
+"""
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from sqlalchemy import event
+from main import app, db
+from model.user import User
+
+counts = {'statements': 0, 'commits': 0}
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    counts['statements'] += 1
+
+def count_commit(conn):
+    counts['commits'] += 1
+
+def login(client, uid):
+    token = jwt.encode({'_uid': uid}, app.config['SECRET_KEY'], algorithm='HS256')
+    client.set_cookie(app.config['JWT_TOKEN_NAME'], token)
+
+def measure(client, method, url, body):
+    counts.update(statements=0, commits=0)
+    start = time.perf_counter()
+    response = client.open(url, method=method, json=body)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+    return counts['statements'], counts['commits'], elapsed
+
+def run(unit_of_work, iterations):
+    app.config['UNIT_OF_WORK'] = unit_of_work
+    client = app.test_client()
+    totals = {'create': [0, 0, 0.0], 'update': [0, 0, 0.0]}
+    for i in range(iterations):
+        uid = f'uow_bench_{int(unit_of_work)}_{i}'
+        for path, method, body in (('create', 'POST', {'name': f'Bench {i}', 'uid': uid, 'password': 'bench123'}),
+                                   ('update', 'PUT', {'name': f'Bench {i} renamed', 'uid': f'{uid}_r'})):
+            if path == 'update':
+                login(client, uid)
+            statements, commits, elapsed = measure(client, method, '/api/user', body)
+            totals[path][0] += statements
+            totals[path][1] += commits
+            totals[path][2] += elapsed
+    return {path: [value / iterations for value in total] for path, total in totals.items()}
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    event.listen(engine, 'commit', count_commit)
+    try:
+        results = {mode: run(mode, iterations) for mode in (False, True)}
+    finally:
+        with app.app_context():
+            User.query.filter(User._uid.like('uow_bench_%')).delete(synchronize_session=False)
+            db.session.commit()
+
+    print(f"{engine.dialect.name}, {iterations} iterations, per request")
+    print(f"{'path':<10}{'mode':<16}{'statements':>12}{'commits':>10}{'latency (ms)':>14}")
+    for path in ('create', 'update'):
+        for mode, name in ((False, 'commit per call'), (True, 'unit of work')):
+            statements, commits, elapsed = results[mode][path]
+            print(f"{path:<10}{name:<16}{statements:>12.1f}{commits:>10.1f}{elapsed * 1000:>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+""" bench_user_read.py
+Compares full User.read() serialization with field projection for the user list endpoints.
+
+Builds a throwaway SQLite database with 10k users carrying the default grade_data and ap_exam
+JSON blobs, then times query + read + JSON encoding and reports the payload size for:
+- all fields, as /api/users returned before projection
+- ?fields=uid,name,role, as the admin user tables use
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_user_read.py
+
+Or run from the root of the project:
+> scripts/bench_user_read.py [user_count]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, load_only
+from werkzeug.security import generate_password_hash
+from model.user import User
+import model.post  # registers Post, Channel and Group for the User relationships
+
+GRADE_DATA = {
+    'grade': 'A', 'attendance': 5, 'work_habits': 5, 'behavior': 5, 'timeliness': 5, 'tech_sense': 4,
+    'tech_talk': 4, 'tech_growth': 4, 'advocacy': 4, 'communication_collaboration': 5, 'integrity': 5,
+    'organization': 5
+}
+AP_EXAM = {
+    'predicted_score': {
+        'practice_based': {'mcq_2018': 0, 'mcq_2020': 0, 'mcq_2021': 0, 'practice_frq': 0,
+                           'predicted_ap_score': 0, 'confidence_level': 'Low'},
+        'manual_calculator': {'mcq_score': 60, 'frq_score': 6, 'composite_score': 90, 'predicted_ap_score': 5}
+    },
+    'last_updated': None
+}
+
+def seed(engine, count):
+    User.metadata.create_all(engine, tables=[User.__table__])
+    password = generate_password_hash('password', "pbkdf2:sha256", salt_length=10)
+    rows = [{
+        '_name': f'User {i}', '_uid': f'user{i}', '_email': '?', '_password': password, '_role': 'User',
+        '_pfp': '', '_car': '', '_grade_data': GRADE_DATA, '_ap_exam': AP_EXAM
+    } for i in range(count)]
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), rows)
+
+def run(engine, fields, repeat=5):
+    best = None
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            query = session.query(User)
+            if fields:
+                query = query.options(load_only(*[getattr(User, User.READ_FIELDS[field]) for field in fields]))
+            payload = json.dumps([user.read(fields) for user in query.all()])
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(payload)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        seed(engine, count)
+        full_time, full_size = run(engine, None)
+        fields = User.parse_fields('uid,name,role')
+        proj_time, proj_size = run(engine, fields)
+        engine.dispose()
+
+    print(f"{count} users")
+    print(f"{'fields':<20}{'latency (ms)':>14}{'payload (KB)':>14}")
+    print(f"{'all':<20}{full_time * 1000:>14.1f}{full_size / 1024:>14.1f}")
+    print(f"{'uid,name,role':<20}{proj_time * 1000:>14.1f}{proj_size / 1024:>14.1f}")
+    print(f"speedup {full_time / proj_time:.1f}x, payload {full_size / proj_size:.1f}x smaller")
+
+if __name__ == "__main__":
+    main()
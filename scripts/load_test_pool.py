@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+""" load_test_pool.py
+Bursts concurrent requests at the database connection pool and reports latency and the pool gauges.
+
+Each simulated request checks a connection out of the app's engine, runs a query, holds the connection
+for --hold-ms as a handler doing work would, and returns it. With more threads than pool_size +
+max_overflow, requests queue for a connection; the report shows how long they waited, how many timed
+out and how many stale connections pre-ping replaced. It runs against the configured database: MySQL
+when DB_ENDPOINT is set, otherwise the SQLite file, so the DB_POOL_* settings can be tried locally first.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./load_test_pool.py
+
+Or run from the root of the project:
+> DB_POOL_SIZE=5 DB_MAX_OVERFLOW=5 scripts/load_test_pool.py --threads 40 --requests 2000 --hold-ms 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from __init__ import app, db
+
+def request(hold):
+    start = time.perf_counter()
+    with app.app_context():
+        try:
+            db.session.execute(text('SELECT 1')).scalar()
+            time.sleep(hold)
+        except PoolTimeoutError:
+            return None
+        finally:
+            db.session.remove()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, default=40, help='concurrent requests')
+    parser.add_argument('--requests', type=int, default=2000, help='total requests')
+    parser.add_argument('--hold-ms', type=float, default=20, help='milliseconds each request holds its connection')
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        print(f"{engine.dialect.name}: pool_size={options['pool_size']} max_overflow={options['max_overflow']} "
+              f"pool_timeout={options['pool_timeout']}s, {args.threads} threads, {args.requests} requests, "
+              f"{args.hold_ms:g} ms hold")
+
+    peak = {'in_use': 0}
+    stop = threading.Event()
+    def sample():
+        while not stop.is_set():
+            peak['in_use'] = max(peak['in_use'], engine.pool.checkedout())
+            time.sleep(0.005)
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        latencies = list(executor.map(request, [args.hold_ms / 1000] * args.requests))
+    elapsed = time.perf_counter() - start
+    stop.set()
+
+    served = sorted(latency for latency in latencies if latency is not None)
+    percentile = lambda p: served[min(len(served) - 1, int(len(served) * p))] * 1000 if served else 0
+    stats = engine.pool.read()
+    print(f"throughput      {len(served) / elapsed:.0f} requests/s")
+    print(f"latency (ms)    p50 {percentile(0.5):.1f}  p99 {percentile(0.99):.1f}  max {percentile(1):.1f}")
+    print(f"peak in use     {peak['in_use']}")
+    print(f"checkout wait   avg {stats['wait_avg_ms']} ms  max {stats['wait_max_ms']} ms  slow {stats['waited']} of {stats['checkouts']}")
+    print(f"timeouts        {stats['timeouts']}")
+    print(f"invalidated     {stats['invalidated']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+""" load_test_upstream.py
+Load tests the proxy endpoints against a slow local upstream, with sync and with gthread workers.
+
+Starts a stub server that answers every call after --delay-ms, as api-ninjas or aviationstack would
+on a slow day. Starts gunicorn with UPSTREAM_BASE_URL pointing at the stub, and sends --clients
+concurrent clients at /api/weather, /api/convertcurrency and /api/flight-api. It does this once with
+sync workers and once with the same workers running --threads threads each, and reports throughput,
+latency and how many calls were turned away with 503. Needs gunicorn.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./load_test_upstream.py
+
+Or run from the root of the project:
+> scripts/load_test_upstream.py --workers 3 --threads 64 --clients 200 --requests 2000 --delay-ms 250
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PATHS = ['/api/weather?lat=32.7&lon=-117.1', '/api/convertcurrency?have=USD&want=EUR&amount=10',
+         '/api/flight-api?origin=SAN&destination=SFO']
+
+def stub_server(delay):
+    class SlowUpstream(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps({'path': self.path, 'temp': 21, 'new_amount': 9.2, 'data': []}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowUpstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def call(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+def run(args, upstream_url, threads):
+    port = free_port()
+    env = {**os.environ, 'GUNICORN_WORKERS': str(args.workers), 'GUNICORN_THREADS': str(threads),
+           'GUNICORN_BIND': f'127.0.0.1:{port}', 'GUNICORN_TIMEOUT': '120', 'UPSTREAM_BASE_URL': upstream_url,
+           'METRICS_SLOW_REQUEST_MS': '0'}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'main:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f'{base}/metrics', timeout=5).read()
+                break
+            except urllib.error.HTTPError:
+                break  # answered, /metrics is refused without METRICS_TOKEN
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.5)
+        urls = [base + PATHS[i % len(PATHS)] for i in range(args.requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            results = list(executor.map(call, urls))
+        return results, time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=64, help='threads per worker for the gthread run')
+    parser.add_argument('--clients', type=int, default=200, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=2000, help='total requests')
+    parser.add_argument('--delay-ms', type=float, default=250, help='upstream response delay')
+    args = parser.parse_args()
+
+    stub = stub_server(args.delay_ms / 1000)
+    upstream_url = f'http://127.0.0.1:{stub.server_address[1]}'
+    print(f"{args.workers} workers, {args.clients} clients, {args.requests} requests, upstream delay {args.delay_ms:g} ms")
+    print(f"{'worker':<18}{'requests/s':>11}{'p50 (ms)':>10}{'p99 (ms)':>10}{'ok':>7}{'503':>6}{'other':>7}")
+    for name, threads in (('sync', 1), (f'gthread x{args.threads}', args.threads)):
+        results, elapsed = run(args, upstream_url, threads)
+        latencies = sorted(latency for status, latency in results)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        ok = sum(1 for status, latency in results if status == 200)
+        busy = sum(1 for status, latency in results if status == 503)
+        print(f"{name:<18}{len(results) / elapsed:>11.1f}{percentile(0.5):>10.0f}{percentile(0.99):>10.0f}"
+              f"{ok:>7}{busy:>6}{len(results) - ok - busy:>7}")
+    stub.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" measure_worker_memory.py
+Compares the memory of gunicorn with and without preload, across worker counts.
+
+For each worker count and preload setting, starts gunicorn with gunicorn.conf.py on a spare port, and
+warms it with requests to both prediction endpoints so every worker has its models loaded. It then
+reads the memory of the master and the workers from /proc. RSS counts shared pages once per process.
+PSS divides each shared page among the processes sharing it, so the PSS total is what the server
+really uses. Needs Linux and gunicorn.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./measure_worker_memory.py
+
+Or run from the root of the project:
+> scripts/measure_worker_memory.py --workers 3 8
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+TWEET = {'tweet_text': 'Excited for a new doctor to join us?', 'is_retweet': 'false', 'type': None}
+GRADES = {'inputs': [4, 5, 3, 4, 5, 4, 3, 4, 5, 4, 4]}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def post(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode(), {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.status
+
+def memory(pid):
+    """
+    Returns the RSS and PSS of a process in bytes.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0]) * 1024
+    return values['Rss'], values['Pss']
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+def measure(workers, preload, warmup):
+    port = free_port()
+    env = {**os.environ, 'GUNICORN_WORKERS': str(workers), 'GUNICORN_PRELOAD': str(preload).lower(),
+           'GUNICORN_BIND': f'127.0.0.1:{port}'}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'main:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        deadline = time.time() + 120
+        while True:
+            try:
+                urllib.request.urlopen(f'{base}/metrics', timeout=5).read()
+                break
+            except urllib.error.HTTPError:
+                break  # answered, /metrics is refused without METRICS_TOKEN
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError(f"gunicorn with {workers} workers did not start")
+                time.sleep(0.5)
+        # Concurrent requests spread over the workers, so each builds its models when not preloaded
+        with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+            list(executor.map(lambda i: (post(f'{base}/socialMediaModel', TWEET), post(f'{base}/api/grade/predict', GRADES)),
+                              range(workers * warmup)))
+        pids = [server.pid] + children(server.pid)
+        totals = [memory(pid) for pid in pids]
+        return len(pids) - 1, sum(rss for rss, pss in totals), sum(pss for rss, pss in totals)
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[3, 8], help='worker counts to compare')
+    parser.add_argument('--warmup', type=int, default=10, help='requests per worker to each prediction endpoint')
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'preload':>9}{'RSS total (MB)':>16}{'PSS total (MB)':>16}{'PSS/worker (MB)':>17}")
+    for workers in args.workers:
+        for preload in (False, True):
+            started, rss, pss = measure(workers, preload, args.warmup)
+            print(f"{started:>8}{str(preload):>9}{rss / 2**20:>16.1f}{pss / 2**20:>16.1f}{pss / started / 2**20:>17.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+""" profile_imports.py
+Reports what the app spends its boot time importing, from Python's -X importtime trace.
+
+Starts a fresh interpreter that imports main with -X importtime, the way a gunicorn worker or a
+`flask custom ...` command does, and parses the trace it writes to stderr. The report lists the
+modules with the most cumulative import time, the top-level packages with the most time of their own,
+and the boot time and resident memory the worker recorded. Run it with PRELOAD_MODELS=true to see the
+cost of building the prediction models at boot instead of on their first request.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./profile_imports.py
+
+Or run from the root of the project:
+> scripts/profile_imports.py [--top 25] [--depth 2] [--module main]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+from api.metrics import metrics
+print(json.dumps({{'import_seconds': time.perf_counter() - start, **(metrics.boot or {{}})}}))
+"""
+
+def parse_importtime(trace):
+    """
+    Parses the lines written by -X importtime.
+
+    Args:
+        trace (str): The stderr of the interpreter.
+
+    Returns:
+        list: (module, depth, self microseconds, cumulative microseconds) in import order.
+    """
+    rows = []
+    for line in trace.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(own), int(cumulative)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--module', default='main', help='module to import')
+    parser.add_argument('--top', type=int, default=25, help='modules to list')
+    parser.add_argument('--depth', type=int, default=2, help='deepest import level listed')
+    args = parser.parse_args()
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD.format(module=args.module)],
+                            cwd=ROOT, capture_output=True, text=True, env={**os.environ, 'PYTHONPATH': ROOT})
+    if result.returncode != 0:
+        sys.exit(result.stderr[-2000:])
+    boot = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+
+    packages = defaultdict(int)
+    for name, depth, own, cumulative in rows:
+        packages[name.split('.')[0]] += own
+
+    print(f"import {args.module}: {boot['import_seconds']:.2f} s")
+    if 'boot_seconds' in boot:
+        print(f"worker boot:   {boot['boot_seconds']:.2f} s from process start, {boot['rss_bytes'] / 2**20:.1f} MB resident")
+    print(f"\n{'cumulative (ms)':>16}{'self (ms)':>11}  module")
+    listed = sorted((row for row in rows if row[1] <= args.depth), key=lambda row: row[3], reverse=True)
+    for name, depth, own, cumulative in listed[:args.top]:
+        print(f"{cumulative / 1000:>16.1f}{own / 1000:>11.1f}  {'  ' * depth}{name}")
+    print(f"\n{'self (ms)':>16}  package")
+    for package, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{own / 1000:>16.1f}  {package}")
+
+if __name__ == "__main__":
+    main()
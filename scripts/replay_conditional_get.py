@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+""" replay_conditional_get.py
+Replays a browsing session against the catalog endpoints, with and without conditional GET.
+
+Each simulated page load fetches /api/sections, /api/groups, /api/channels and /api/waypoints/catalog,
+as the front end does. Every --write-every page loads a channel is created, the way an admin edits
+the catalog. The session runs twice. The first browser ignores ETags and always gets 200. The second
+keeps the ETag of each response and sends it back in If-None-Match, so it gets 304 until a write
+changes the table. The report counts full responses, SQL statements, bytes and time. The channels
+created are deleted at the end.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./replay_conditional_get.py
+
+Or run from the root of the project:
+> scripts/replay_conditional_get.py [--pages 200] [--write-every 25]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+from sqlalchemy import event
+from main import app, db
+from model.channel import Channel
+from model.group import Group
+
+ENDPOINTS = ['/api/sections', '/api/groups', '/api/channels', '/api/waypoints/catalog']
+statements = [0]
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements[0] += 1
+
+def replay(client, pages, write_every, conditional):
+    etags = {}
+    totals = {'requests': 0, 'full': 0, 'not_modified': 0, 'bytes': 0, 'statements': 0, 'seconds': 0.0}
+    for page in range(pages):
+        if write_every and page and page % write_every == 0:
+            with app.app_context():
+                Channel(f'replay_{int(conditional)}_{page}', Group.query.first().id).create()
+        for endpoint in ENDPOINTS:
+            headers = {'If-None-Match': etags[endpoint]} if conditional and endpoint in etags else {}
+            statements[0] = 0
+            start = time.perf_counter()
+            response = client.get(endpoint, headers=headers)
+            body = response.get_data()
+            totals['seconds'] += time.perf_counter() - start
+            totals['statements'] += statements[0]
+            totals['requests'] += 1
+            totals['bytes'] += len(body)
+            if response.status_code == 304:
+                totals['not_modified'] += 1
+            elif response.status_code == 200:
+                totals['full'] += 1
+                if response.headers.get('ETag'):
+                    etags[endpoint] = response.headers['ETag']
+            else:
+                raise RuntimeError(f"{endpoint} returned {response.status_code}")
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pages', type=int, default=200, help='page loads in the session')
+    parser.add_argument('--write-every', type=int, default=25, help='page loads between catalog writes, 0 for none')
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    client = app.test_client()
+    client.set_cookie(app.config['JWT_TOKEN_NAME'],
+                      jwt.encode({'_uid': app.config['ADMIN_USER']}, app.config['SECRET_KEY'], algorithm='HS256'))
+    try:
+        results = {mode: replay(client, args.pages, args.write_every, mode) for mode in (False, True)}
+    finally:
+        with app.app_context():
+            Channel.query.filter(Channel._name.like('replay_%')).delete(synchronize_session=False)
+            db.session.commit()
+
+    print(f"{args.pages} page loads x {len(ENDPOINTS)} endpoints, a catalog write every {args.write_every} page loads")
+    print(f"{'browser':<14}{'200':>7}{'304':>7}{'SQL statements':>16}{'KB':>9}{'time (ms)':>11}")
+    for mode, name in ((False, 'no ETags'), (True, 'If-None-Match')):
+        totals = results[mode]
+        print(f"{name:<14}{totals['full']:>7}{totals['not_modified']:>7}{totals['statements']:>16}"
+              f"{totals['bytes'] / 1024:>9.1f}{totals['seconds'] * 1000:>11.1f}")
+    plain, conditional = results[False], results[True]
+    print(f"full responses -{1 - conditional['full'] / plain['full']:.0%}, "
+          f"SQL statements -{1 - conditional['statements'] / plain['statements']:.0%}")
+
+if __name__ == "__main__":
+    main()